@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+changeset.py
+- plan 모드 결과(변경할 본문 / draw.io 첨부 새 바이트)를 PUT 대신 changeset 디렉터리에 기록하고, 나중에 따로 적용
+- 디렉터리 구성
+    changes.jsonl  : 첫 줄 = 헤더, 이후 한 줄 = 한 변경
+        header     : {"t": "header", "base_url", "rules"}  plan 을 만든 서버 / 규칙 해시 (다른 서버에는 적용하지 않음)
+        page       : {"t": "page", "id", "title", "space", "version", "base_hash", "new_hash", "blob"}
+        attachment : {"t": "attachment", "page", "att", "file", "content_type", "version", "blob"}
+    blobs/ab/abcd… : 본문/첨부 바이트 (sha1 이름, gzip 압축, 같은 내용은 한 번만 저장)
+    applied.jsonl  : 적용기가 끝낸 변경 키 (다시 실행하면 건너뜀)
+- apply_changeset : 여러 writer 스레드로 동시에 적용, 초당 요청 수 제한(RateLimiter)
+    헤더의 base_url 이 client.base_url 과 다르거나 헤더가 없으면 적용하지 않음 (ValueError)
+    버전 충돌(409) 시 현재 본문을 다시 받아
+      - 현재 본문 == plan 의 새 본문  → already (이미 적용됨)
+      - 현재 본문 == plan 기준 본문   → 최신 버전 번호로 한 번 더 PUT (본문 외 변경으로 버전만 오른 경우)
+      - 그 외(plan 이후 본문 수정)    → conflict, 다시 plan 필요
+    첨부는 업로드 전에 현재 버전을 plan 시점 버전("version")과 비교, 다르면 현재 내용을 받아
+      - 현재 내용 == plan 의 새 내용 → already
+      - 그 외(plan 이후 첨부 수정)   → conflict (덮어쓰지 않음)
+"""
+
+from typing import IO, Any, Dict, Iterator, Optional, Union
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+from confluence_client import ConfluenceClient, CHUNK_SIZE
+from page_state import body_hash
+
+CHANGES_FILE = "changes.jsonl"
+APPLIED_FILE = "applied.jsonl"
+BLOB_DIR = "blobs"
+
+
+def _blob_path(path: str, digest: str) -> str:
+    return os.path.join(path, BLOB_DIR, digest[:2], digest)
+
+
+def load_blob(path: str, digest: str) -> bytes:
+    with gzip.open(_blob_path(path, digest), "rb") as f:
+        return f.read()
+
+
+def _same_base_url(a: Optional[str], b: Optional[str]) -> bool:
+    return (a or "").rstrip("/") == (b or "").rstrip("/")
+
+
+class ChangesetWriter:
+    def __init__(self, path: str, resume: bool = False, base_url: Optional[str] = None, rules: Optional[str] = None):
+        """base_url / rules 는 헤더에 기록 (resume 이면 기존 헤더와 같아야 함)"""
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(path, BLOB_DIR), exist_ok=True)
+        changes = os.path.join(path, CHANGES_FILE)
+        header = read_header(path) if resume and os.path.exists(changes) else None
+        if header is not None and (not _same_base_url(header.get("base_url"), base_url) or header.get("rules") != rules):
+            raise ValueError(f"Changeset {path} was planned against {header.get('base_url')} with other settings")
+        self._file = open(changes, "a" if resume else "w", encoding="utf-8")
+        if header is None:
+            self._write({"t": "header", "base_url": base_url, "rules": rules})
+
+    def _put_blob(self, data: bytes) -> str:
+        digest = hashlib.sha1(data).hexdigest()
+        blob = _blob_path(self.path, digest)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmp = f"{blob}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, blob)
+        return digest
+
+    def _put_blob_stream(self, fileobj: IO[bytes]) -> str:
+        """파일 객체를 CHUNK_SIZE 단위로 해시하면서 임시 blob 에 복사 (첨부 전체를 메모리에 올리지 않음)"""
+        sha = hashlib.sha1()
+        tmp = os.path.join(self.path, BLOB_DIR, f"incoming.{threading.get_ident()}.tmp")
+        with gzip.open(tmp, "wb") as f:
+            for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+                sha.update(chunk)
+                f.write(chunk)
+        digest = sha.hexdigest()
+        blob = _blob_path(self.path, digest)
+        if os.path.exists(blob):
+            os.remove(tmp)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.replace(tmp, blob)
+        return digest
+
+    def _write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def add_page(self, page_id: str, title: str, space: str, version: int, old_body: str, new_body: str):
+        """version 은 plan 을 만든 시점의 현재 버전 (적용 시 version + 1 로 PUT)"""
+        self._write({
+            "t": "page", "id": str(page_id), "title": title, "space": space, "version": version,
+            "base_hash": body_hash(old_body), "new_hash": body_hash(new_body),
+            "blob": self._put_blob(new_body.encode("utf-8")),
+        })
+
+    def add_attachment(self, page_id: str, att_id: str, filename: str, data: Union[bytes, IO[bytes]],
+                       content_type: str, version: Optional[int] = None):
+        """
+        version 은 plan 을 만든 시점의 첨부 버전 (적용 시 바뀌었으면 덮어쓰지 않음, None 이면 확인 안 함)
+        data 가 파일 객체면 처음부터 청크 단위로 blob 에 복사
+        """
+        if isinstance(data, (bytes, bytearray)):
+            digest = self._put_blob(bytes(data))
+        else:
+            data.seek(0)
+            digest = self._put_blob_stream(data)
+        self._write({
+            "t": "attachment", "page": str(page_id), "att": att_id, "file": filename,
+            "content_type": content_type, "version": version, "blob": digest,
+        })
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def _read_records(path: str) -> Iterator[Dict[str, Any]]:
+    with open(os.path.join(path, CHANGES_FILE), encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_header(path: str) -> Optional[Dict[str, Any]]:
+    """changeset 헤더 (헤더 없는 이전 형식이면 None)"""
+    for rec in _read_records(path):
+        return rec if rec.get("t") == "header" else None
+    return None
+
+
+def read_changeset(path: str) -> Iterator[Dict[str, Any]]:
+    """변경 레코드 (헤더 제외)"""
+    return (rec for rec in _read_records(path) if rec.get("t") != "header")
+
+
+def _change_key(rec: Dict[str, Any]) -> str:
+    if rec["t"] == "page":
+        return f"page:{rec['id']}:{rec['new_hash']}"
+    return f"attachment:{rec['page']}:{rec['att']}:{rec['blob']}"
+
+
+class RateLimiter:
+    """여러 스레드가 공유하는 초당 요청 수 제한 (rate <= 0 이면 제한 없음)"""
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next)
+            self._next = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+def _put_page(client: ConfluenceClient, rec: Dict[str, Any], body: str, version: int):
+    payload = {
+        "id": rec["id"],
+        "type": "page",
+        "title": rec["title"],
+        "space": {"key": rec["space"]},
+        "body": {"storage": {"value": body, "representation": "storage"}},
+        "version": {"number": version + 1},
+    }
+    return client.update_content(rec["id"], payload)
+
+
+def _apply_page(client: ConfluenceClient, path: str, rec: Dict[str, Any], limiter: RateLimiter) -> str:
+    body = load_blob(path, rec["blob"]).decode("utf-8")
+    limiter.wait()
+    r = _put_page(client, rec, body, rec["version"])
+    if r.status_code == 200:
+        return "updated"
+    if r.status_code != 409:
+        print(f"❌ Failed: {rec['title']} ({rec['id']}): {r.status_code}")
+        return "failed"
+
+    limiter.wait()
+    current = client.get_content(rec["id"], "body.storage,version")
+    current_hash = body_hash(current["body"]["storage"]["value"])
+    if current_hash == rec["new_hash"]:
+        return "already"
+    if current_hash != rec["base_hash"]:
+        print(f"⚠️ Conflict (edited after plan): {rec['title']} ({rec['id']})")
+        return "conflict"
+
+    limiter.wait()
+    r = _put_page(client, rec, body, current["version"]["number"])
+    if r.status_code == 200:
+        return "updated"
+    print(f"❌ Failed after version refresh: {rec['title']} ({rec['id']}): {r.status_code}")
+    return "failed"
+
+
+def _apply_attachment(client: ConfluenceClient, path: str, rec: Dict[str, Any], limiter: RateLimiter) -> str:
+    if rec.get("version") is not None:
+        limiter.wait()
+        current = client.get_content(rec["att"], "version")
+        if current["version"]["number"] != rec["version"]:
+            limiter.wait()
+            r = client.download_attachment(current)
+            if hashlib.sha1(r.content).hexdigest() == rec["blob"]:
+                return "already"
+            print(f"⚠️ Conflict (edited after plan): {rec['file']} ({rec['page']}/{rec['att']})")
+            return "conflict"
+
+    limiter.wait()
+    client.upload_attachment(rec["page"], rec["att"], rec["file"], load_blob(path, rec["blob"]), rec["content_type"])
+    return "uploaded"
+
+
+def apply_changeset(client: ConfluenceClient, path: str, workers: int = 4, rate: float = 5.0) -> Dict[str, int]:
+    """
+    changeset 을 workers 개 writer 로 적용하고 상태별 개수 반환.
+    applied.jsonl 에 있는 변경은 건너뜀 → 중단 후 다시 실행해도 이어서 적용.
+    plan 을 만든 서버(헤더의 base_url)가 client.base_url 과 다르면 ValueError.
+    """
+    header = read_header(path)
+    if header is None:
+        raise ValueError(f"Changeset {path} has no header (server unknown), plan it again")
+    if not _same_base_url(header.get("base_url"), client.base_url):
+        raise ValueError(f"Changeset {path} was planned against {header.get('base_url')}, not {client.base_url}")
+
+    applied_path = os.path.join(path, APPLIED_FILE)
+    done = set()
+    if os.path.exists(applied_path):
+        with open(applied_path, encoding="utf-8") as f:
+            done = {line.strip() for line in f if line.strip()}
+
+    all_records = list(read_changeset(path))
+    records = [rec for rec in all_records if _change_key(rec) not in done]
+    limiter = RateLimiter(rate)
+    counts: Counter = Counter()
+    lock = threading.Lock()
+
+    with open(applied_path, "a", encoding="utf-8") as applied:
+        def apply(rec):
+            try:
+                if rec["t"] == "page":
+                    status = _apply_page(client, path, rec, limiter)
+                else:
+                    status = _apply_attachment(client, path, rec, limiter)
+            except Exception as e:
+                print(f"❌ Apply failed: {_change_key(rec)}: {e}")
+                status = "failed"
+            with lock:
+                counts[status] += 1
+                if status in ("updated", "already", "uploaded"):
+                    applied.write(_change_key(rec) + "\n")
+                    applied.flush()
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+            list(ex.map(apply, records))
+
+    counts["skipped"] = len(all_records) - len(records)  # 이 changeset 중 이미 적용된 변경
+    return dict(counts)
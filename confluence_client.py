@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+confluence_client.py
+- 모든 스크립트가 공유하는 Confluence REST 클라이언트 (requests.Session 상속)
+- keep-alive 커넥션 풀(동시 실행 수에 맞춰 pool_size 지정), 재시도/backoff(GET/PUT 만, 끝나면 마지막 응답 반환), 기본 timeout, 인증(헤더/basic auth)
+- base_url 기준 상대경로도 허용: client.get("/rest/api/content/123")
+- content / search / child / attachment / tiny-link 용 헬퍼 제공
+"""
+
+from typing import IO, Iterable, Iterator, Optional, Dict, Any, Tuple, Union
+from urllib.parse import urljoin, urlparse
+import io
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (10, 60)  # (connect, read) 초
+CHUNK_SIZE = 64 * 1024      # 스트리밍 다운로드/업로드 단위
+
+
+class _MultipartFile:
+    """
+    파일 객체 하나를 multipart/form-data 본문처럼 읽히게 하는 스트림.
+    requests 가 read() 로 조금씩 보내므로 파일 전체를 메모리에 올리지 않음 (Content-Length 는 __len__).
+    tell/seek 를 지원해 재시도(Retry) 시 urllib3 가 본문을 처음부터 다시 보낼 수 있음.
+    """
+    def __init__(self, field: str, filename: str, fileobj: IO[bytes], content_type: str):
+        boundary = uuid.uuid4().hex
+        safe_name = filename.replace("\\", "\\\\").replace('"', "%22")
+        self._head = (f'--{boundary}\r\n'
+                      f'Content-Disposition: form-data; name="{field}"; filename="{safe_name}"\r\n'
+                      f'Content-Type: {content_type}\r\n\r\n').encode("utf-8")
+        self._tail = f"\r\n--{boundary}--\r\n".encode("ascii")
+        fileobj.seek(0, io.SEEK_END)
+        self._size = fileobj.tell()
+        self._file = fileobj
+        self._pos = 0
+        self._length = len(self._head) + self._size + len(self._tail)
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+
+    def __len__(self) -> int:
+        return self._length
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._length
+        self._pos = max(0, min(offset, self._length))
+        return self._pos
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._length - self._pos
+        head_end = len(self._head)
+        file_end = head_end + self._size
+        out = []
+        while size > 0 and self._pos < self._length:
+            if self._pos < head_end:
+                chunk = self._head[self._pos:self._pos + size]
+            elif self._pos < file_end:
+                self._file.seek(self._pos - head_end)
+                chunk = self._file.read(min(size, file_end - self._pos))
+            else:
+                off = self._pos - file_end
+                chunk = self._tail[off:off + size]
+            if not chunk:
+                break
+            out.append(chunk)
+            self._pos += len(chunk)
+            size -= len(chunk)
+        return b"".join(out)
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            chunk = self.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+class ConfluenceClient(requests.Session):
+    def __init__(self, base_url: str,
+                 headers: Optional[Dict[str, str]] = None,
+                 auth: Optional[Tuple[str, str]] = None,
+                 pool_size: int = 10,
+                 timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+                 retries: int = 3,
+                 backoff_factor: float = 0.4):
+        super().__init__()
+        self.base_url = base_url
+        self.timeout = timeout
+        self.headers.update(headers or {})
+        if auth:
+            self.auth = auth
+
+        # 재시도가 끝나면 예외(RetryError) 대신 마지막 응답을 반환 → 호출 쪽 status_code 분기가 그대로 동작
+        # POST(첨부 업로드)는 재시도하지 않음: 5xx 라도 새 버전이 이미 생겼을 수 있어 중복 버전이 됨
+        # (PUT 은 version 번호로 보호되어 중복 적용되지 않음)
+        retry = Retry(
+            total=retries, backoff_factor=backoff_factor,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET", "PUT"],
+            raise_on_status=False,
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    # ---- 공통 ----
+    def url(self, path: str) -> str:
+        """절대 URL 은 그대로, '/rest/...' 같은 경로는 base_url(컨텍스트 경로 포함) 기준으로."""
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        base = self.base_url if self.base_url.endswith("/") else self.base_url + "/"
+        return urljoin(base, path.lstrip("/"))
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, self.url(url), *args, **kwargs)
+
+    def get_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        r = self.get(path, params=params, headers={"Accept": "application/json"})
+        r.raise_for_status()
+        return r.json()
+
+    def paginate(self, path: str, params: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """results 목록 API 를 _links.next 가 없을 때까지 따라가며 항목 단위로 yield."""
+        url: Optional[str] = path
+        while url:
+            data = self.get_json(url, params)
+            results = data.get("results", [])
+            yield from results
+
+            next_link = (data.get("_links", {}) or {}).get("next")
+            if not results or not next_link:
+                break
+            url, params = next_link, None  # _links.next 는 컨텍스트 경로 기준 상대경로 (쿼리 포함)
+
+    # ---- content ----
+    def get_content(self, page_id: str, expand: Optional[str] = None) -> Dict[str, Any]:
+        return self.get_json(f"/rest/api/content/{page_id}", {"expand": expand} if expand else None)
+
+    def update_content(self, page_id: str, payload: Dict[str, Any]) -> requests.Response:
+        return self.put(f"/rest/api/content/{page_id}", json=payload)
+
+    def list_content(self, space_key: str, content_type: str = "page", expand: Optional[str] = None,
+                     page_size: int = 100) -> Iterator[Dict[str, Any]]:
+        params: Dict[str, Any] = {"spaceKey": space_key, "type": content_type, "limit": page_size, "start": 0}
+        if expand:
+            params["expand"] = expand
+        return self.paginate("/rest/api/content", params)
+
+    def find_content_by_title(self, space_key: str, title: str,
+                              expand: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        params: Dict[str, Any] = {"spaceKey": space_key, "title": title}
+        if expand:
+            params["expand"] = expand
+        results = self.get_json("/rest/api/content", params).get("results", [])
+        return results[0] if results else None
+
+    # ---- search ----
+    def search(self, cql: str, limit: int = 100, expand: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """GET /rest/api/search (결과 항목: {"content": {...}, "title": ...})"""
+        params: Dict[str, Any] = {"cql": cql, "limit": limit}
+        if expand:
+            params["expand"] = expand
+        return self.paginate("/rest/api/search", params)
+
+    def content_search(self, cql: str, limit: int = 100, expand: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """GET /rest/api/content/search (결과 항목이 content JSON 그대로라 expand=space 등 사용 가능)"""
+        params: Dict[str, Any] = {"cql": cql, "limit": limit}
+        if expand:
+            params["expand"] = expand
+        return self.paginate("/rest/api/content/search", params)
+
+    def get_contents_by_ids(self, page_ids: Iterable[str], expand: Optional[str] = None,
+                            chunk_size: int = 50) -> Iterator[Dict[str, Any]]:
+        """id 목록을 chunk_size 개씩 CQL 'id in (...)' 로 조회. 없거나 권한 없는 id 는 결과에서 빠짐."""
+        ids = list(dict.fromkeys(str(i) for i in page_ids))
+        for i in range(0, len(ids), chunk_size):
+            chunk = ids[i:i + chunk_size]
+            yield from self.content_search(f"id in ({','.join(chunk)})", limit=len(chunk), expand=expand)
+
+    # ---- child ----
+    def child_pages(self, page_id: str, expand: Optional[str] = None,
+                    page_size: int = 100) -> Iterator[Dict[str, Any]]:
+        params: Dict[str, Any] = {"limit": page_size, "start": 0}
+        if expand:
+            params["expand"] = expand
+        return self.paginate(f"/rest/api/content/{page_id}/child/page", params)
+
+    # ---- attachment ----
+    def attachments(self, page_id: str, expand: Optional[str] = "metadata.labels,metadata.mediaType",
+                    page_size: int = 100, media_type: Optional[str] = None,
+                    filename: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """첨부 목록 (_links.next 끝까지). media_type / filename 을 주면 서버에서 걸러서 반환."""
+        params: Dict[str, Any] = {"limit": page_size, "start": 0}
+        if expand:
+            params["expand"] = expand
+        if media_type:
+            params["mediaType"] = media_type
+        if filename:
+            params["filename"] = filename
+        return self.paginate(f"/rest/api/content/{page_id}/child/attachment", params)
+
+    def download_attachment(self, att: Dict[str, Any], **kwargs) -> requests.Response:
+        """
+        첨부 객체의 _links.download 로 다운로드. 컨텍스트 경로 기준 404 면 host 루트 기준으로 재시도.
+        """
+        dl_path = (att.get("_links", {}) or {}).get("download")  # 예: "/download/attachments/12345/diagram?version=2&api=v2"
+        if not dl_path:
+            raise RuntimeError(f"No download link in attachment: {att.get('id')}")
+
+        r = self.get(dl_path, allow_redirects=True, **kwargs)
+        if r.status_code == 404:
+            # 일부 인스턴스는 컨텍스트 경로 이슈로 루트(host) 기준이 필요한 경우가 있음
+            p = urlparse(self.base_url)
+            r.close()
+            r = self.get(f"{p.scheme}://{p.netloc}/{dl_path.lstrip('/')}", allow_redirects=True, **kwargs)
+        r.raise_for_status()
+        return r
+
+    def upload_attachment(self, page_id: str, attachment_id: str, filename: str,
+                          data, content_type: str) -> Dict[str, Any]:
+        """
+        첨부 새 버전 업로드. data 는 bytes 또는 (seek 가능한) 파일 객체.
+        파일 객체면 multipart 본문을 만들지 않고 CHUNK_SIZE 단위로 스트리밍 전송.
+        """
+        url = f"/rest/api/content/{page_id}/child/attachment/{attachment_id}/data"
+        filename = filename or "diagram.drawio"
+        content_type = content_type or "application/octet-stream"
+        if isinstance(data, (bytes, bytearray)):
+            files = {"file": (filename, data, content_type)}
+            # 세션 기본 Content-Type(application/json)을 지워야 multipart 경계가 붙은 Content-Type 이 설정됨
+            r = self.post(url, files=files, headers={"X-Atlassian-Token": "nocheck", "Content-Type": None})
+        else:
+            body = _MultipartFile("file", filename, data, content_type)
+            r = self.post(url, data=body, headers={"X-Atlassian-Token": "nocheck", "Content-Type": body.content_type})
+        r.raise_for_status()
+        return r.json()
+
+    # ---- tiny link ----
+    def resolve_tiny(self, short_url: str) -> Optional[str]:
+        """
+        tiny URL(/x/...) 리다이렉트를 따라간 최종 URL. 404 면 None.
+        그 밖의 오류(401/403/429/5xx)는 예외 → 로그인/오류 페이지 URL 을 해석 결과로 캐시하지 않도록.
+        """
+        r = self.get(short_url, allow_redirects=True)
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        return r.url
+
+    def get_tiny_link(self, page_id: str) -> Optional[str]:
+        """page id → tiny link 절대 URL (_links.tinyui)."""
+        data = self.get_content(page_id)
+        tiny = (data.get("_links", {}) or {}).get("tinyui")
+        return self.url(tiny) if tiny else None
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+cpu_pool.py
+- 네트워크 없이 CPU 만 쓰는 치환 작업을 프로세스 풀에서 실행 → GIL 에 묶이지 않고 코어 수만큼 병렬
+    rewrite_body : 본문 링크 치환 (link_rules 규칙 + 미리 해석해 둔 page id / tiny URL 매핑)
+    drawio_utils 의 <diagram> payload 해제/재압축 (drawio_utils.set_cpu_pool 로 연결)
+- 작업 함수는 모듈 최상위 함수라 pickle 로 넘어감. 규칙은 설정값만 보내고 워커 프로세스에서 get_link_rules 로 한 번 컴파일해 재사용
+- 매핑은 풀을 만들 때 initializer 로 워커마다 한 번만 복사 (작업마다 dict 를 보내지 않음)
+  → 매핑이 다 채워진 뒤(2단계 실행의 apply 단계)에만 사용, 매핑에 없는 링크는 그대로 둠
+- run() 은 결과가 올 때까지 호출한 스레드를 막음 → 호출하는 스레드 수(WORKERS)가 프로세스 수 이상이어야 코어를 다 씀
+- workers <= 0 이면 풀 없이 호출한 스레드에서 바로 실행 (같은 인터페이스)
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+
+from link_rules import get_link_rules
+
+# 워커 프로세스 안에서만 채워지는 매핑 (set_mappings)
+_page_ids: Dict[str, Optional[str]] = {}
+_tiny_urls: Dict[str, Optional[str]] = {}
+
+
+def set_mappings(page_ids: Dict[str, Optional[str]], tiny_urls: Dict[str, Optional[str]]):
+    """initializer: 원래 page id → 대상 page id (같으면 변경 없음), tiny URL → 새 URL"""
+    _page_ids.clear()
+    _page_ids.update(page_ids)
+    _tiny_urls.clear()
+    _tiny_urls.update(tiny_urls)
+
+
+def _mapped_page_id(page_id: str) -> Optional[str]:
+    target = _page_ids.get(page_id)
+    return target if target and target != page_id else None
+
+
+def rewrite_body(base_url: str, origin_spaces: List[str], target_space: str, prefix: str,
+                 body: str) -> Tuple[str, List[Tuple[str, str, str]]]:
+    """(새 본문, 치환 목록 [(kind, old, new)]) 반환. 출력(로그)은 호출한 쪽에서."""
+    replaced: List[Tuple[str, str, str]] = []
+    rules = get_link_rules(base_url, origin_spaces, target_space, prefix)
+    new_body = rules.rewrite(body, _mapped_page_id, _tiny_urls.get,
+                             lambda kind, old, new: replaced.append((kind, old, new)))
+    return new_body, replaced
+
+
+class CpuPool:
+    def __init__(self, workers: int = 0,
+                 initializer: Optional[Callable[..., Any]] = None, initargs: Tuple = ()):
+        self.workers = workers
+        self._pool = ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) \
+            if workers > 0 else None
+        if self._pool is None and initializer is not None:
+            initializer(*initargs)  # 풀 없이 실행할 때도 같은 상태로
+
+    def run(self, fn: Callable[..., Any], *args) -> Any:
+        if self._pool is None:
+            return fn(*args)
+        return self._pool.submit(fn, *args).result()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
@@ -3,22 +3,68 @@
 drawio_utils.py
 - Confluence 페이지의 draw.io 첨부(확장자 유무와 무관)를 찾아 내부 URL을 일괄 치환
 - 판별 기준: metadata.labels("drawio") 또는 metadata.mediaType(application/drawio, application/vnd.jgraph.mxfile, image/svg+xml)
-- 다운로드: 첨부 객체의 _links.download 경로를 이용(404 회피)
-- .drawio의 <diagram> payload가 base64+raw-deflate인 경우 자동 해제/재압축(원 형식 보존)
+- 첨부 목록은 페이지네이션하며 후보만 yield (iter_drawio_attachments, server_filter=True 면 서버에서 mediaType 필터)
+- 다운로드: 첨부 객체의 _links.download 경로를 이용(404 회피), 임시 파일로 스트리밍 (SPOOL_MAX_SIZE 초과분은 디스크)
+- .drawio 는 <diagram> payload 구간만 찾아 치환, 나머지 바이트는 그대로 복사 → 메모리는 다이어그램 하나 분량, 업로드도 파일에서 스트리밍
+- .drawio의 <diagram> payload가 base64+raw-deflate인 경우 자동 해제/재압축(원 형식 보존, 재압축 레벨 compress_level)
+- 후보 URL(pageId= / /display/{ORIGIN}/ / /x/, candidate_filter)이 없는 다이어그램/svg 와 바뀌지 않은 다이어그램은 원본 바이트 그대로
 - 본문(new_body)은 변경하지 않고 그대로 반환 (본문 치환은 메인 코드에서 처리)
+- title_index(title_index.build_title_index)를 넘기면 TARGET 공간 제목 조회를 메모리에서 처리
+- cache(resolution_cache.ResolutionCache)를 넘기면 tiny/pageId/제목 해석 결과를 실행 간 재사용
+- 다이어그램의 pageId 링크는 치환 전에 모아 CQL 'id in (...)' 로 묶어 조회 (page_prefetch)
+- URL 치환 결과(None 포함)는 rewrite_memo 에 실행 동안 기억 → 같은 URL 은 다이어그램/첨부/페이지가 달라도 한 번만 해석
+- 여러 워커가 같은 제목/page id/tiny URL 을 동시에 조회하면 single_flight 로 HTTP 요청 한 번만 수행
+- set_tiny_offline(True) 이면 tiny /x/CODE 를 리다이렉트 없이 page id 로 디코딩 (tiny_code, 서버와 대조한 뒤에만 켤 것)
+  → tiny 링크도 pageId 링크처럼 묶음 조회 대상
+- set_cpu_pool(cpu_pool.CpuPool(n)) 이면 <diagram> payload 해제/재압축을 프로세스 n 개에서 (GIL 없이 코어 수만큼)
+- 한 페이지의 첨부들은 workers 개까지 동시에 처리, 첨부별 결과/오류는 페이지당 요약 한 번으로 출력
+- process_drawio_attachments 의 확장 지점: attachments(처리할 첨부를 호출 쪽에서 지정), upload(업로드 대신 호출, plan 모드 등),
+  text_cb(다이어그램별 치환 전/후 평문, 링크 기록 등). scan_drawio_attachment 는 치환 없이 평문만 반환 (2단계 실행 scan)
 """
 
-from typing import List, Tuple, Optional, Callable, Dict, Any
+from typing import IO, Iterable, Iterator, List, Tuple, Optional, Callable, Dict, Any, Union
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import re
 import zlib
 import base64
-import xml.etree.ElementTree as ET
-from urllib.parse import urljoin, urlparse, parse_qs, unquote_plus
+import tempfile
+import html
+from xml.sax.saxutils import escape
+from urllib.parse import urldefrag, urljoin, urlparse, parse_qs, unquote_plus
 
 import requests
 
+from title_index import TitleIndex, lookup_title, page_info_from_content
+from resolution_cache import ResolutionCache
+from confluence_client import ConfluenceClient, CHUNK_SIZE
+from single_flight import SingleFlight
+from page_prefetch import collect_page_ids, prefetch_pages
+from rewrite_memo import RewriteMemo
+from link_rules import KeywordFilter
+from tiny_code import tiny_page_id
+
+# 다운로드/치환 결과를 담는 임시 파일: 이 크기를 넘으면 메모리 대신 디스크 사용
+SPOOL_MAX_SIZE = 4 * 1024 * 1024
+
+# draw.io 로 보는 첨부 미디어타입 (서버 필터링에도 사용)
+DRAWIO_MEDIA_TYPES = ("application/vnd.jgraph.mxfile", "application/drawio", "image/svg+xml")
+
+# 바뀐 <diagram> payload 재압축 zlib 레벨 (1 빠름 ~ 9 작음, draw.io 기본 저장은 9)
+DRAWIO_COMPRESS_LEVEL = 9
+
+# 다이어그램에 이 중 하나라도 있어야 URL 치환 대상 (없으면 치환/재압축 생략)
+# 설정을 모를 때의 기본값, process_drawio_attachments 는 candidate_filter(origin_spaces) 사용
+CANDIDATE_URL_MARKERS = ("pageId=", "/display/", "/x/")
+_default_filter = KeywordFilter(CANDIDATE_URL_MARKERS)
+
+_DIAGRAM_OPEN = b"<diagram"
+_DIAGRAM_CLOSE = b"</diagram>"
+
 # 일반 URL 텍스트 탐지 패턴 (draw.io XML 텍스트에도 쓰임)
-PLAIN_URL_PATTERN = re.compile(r'(https?://[^\s"<]+)')
+# 텍스트 속 URL: 공백/따옴표/'<' 또는 XML 엔티티(&quot; &lt; &gt; &amp; &#..;)에서 끝남
+# (html 라벨 value="&lt;a href=&quot;URL&quot;&gt;텍스트&lt;/a&gt;" 에서 URL 뒤의 닫는 따옴표/텍스트/태그를 삼키지 않도록)
+PLAIN_URL_PATTERN = re.compile(r'(https?://(?:[^\s"\'<&]|&(?!(?:quot|lt|gt|amp|apos|#\d+|#x[0-9a-fA-F]+);))+)')
 
 # ========= 공개 API (메인에서 호출) =========
 def replace_links_drawio(new_body: str,
@@ -26,11 +72,17 @@ def replace_links_drawio(new_body: str,
                          BASE_URL: str,
                          headers: Dict[str, str],
                          ORIGIN_SPACES: List[str],
-                         TARGET_SPACE: str) -> str:
+                         TARGET_SPACE: str,
+                         title_index: Optional[TitleIndex] = None,
+                         cache: Optional[ResolutionCache] = None,
+                         client: Optional[ConfluenceClient] = None,
+                         workers: int = 4, server_filter: bool = False,
+                         compress_level: int = DRAWIO_COMPRESS_LEVEL) -> str:
     """
     해당 페이지의 draw.io 첨부(라벨/미디어타입 기반)를 찾아
     다이어그램 내부 URL을 ORIGIN_SPACES → TARGET_SPACE(동일 제목) 규칙으로 치환.
     변경되면 첨부 새 버전 업로드. 본문 문자열(new_body)은 변경하지 않고 그대로 반환.
+    첨부별 결과는 페이지당 한 번 요약 출력 (process_drawio_attachments 반환값).
 
     Parameters
     ----------
@@ -40,124 +92,176 @@ def replace_links_drawio(new_body: str,
     headers : dict             # 인증/헤더 (Bearer 등)
     ORIGIN_SPACES : list[str]  # 원본 공간 키들
     TARGET_SPACE : str         # 타깃 공간 키
+    title_index : dict | None  # TARGET_SPACE 제목 인덱스 (없으면 제목마다 라이브 조회)
+    cache : ResolutionCache | None  # 영구 해석 캐시 (tiny/pageId/제목 조회 결과 재사용, 없으면 호출 동안만 메모리 캐시)
+    client : ConfluenceClient | None  # 공유 클라이언트 (없으면 BASE_URL/headers 별로 재사용)
+    workers : int              # 한 페이지 안에서 동시에 처리할 첨부 수
+    server_filter : bool       # True 면 첨부 목록을 서버에서 mediaType 으로 걸러 받음 (iter_drawio_attachments)
+    compress_level : int       # 바뀐 다이어그램 재압축 zlib 레벨 (1~9)
     """
-    session = _make_session(headers)
+    client = client or _get_client(BASE_URL, headers)
 
     page_id = page_json.get("id")
     if not page_id:
         return new_body
 
-    # 1) 첨부 조회 (라벨/미디어타입 함께)
-    atts = _list_attachments(session, BASE_URL, page_id)
+    statuses = process_drawio_attachments(client, page_id, ORIGIN_SPACES, TARGET_SPACE,
+                                          title_index, cache, workers, server_filter, compress_level)
+    if statuses:
+        print(format_drawio_summary(page_json.get("title") or page_id, statuses, rewrite_memo.format_stats()))
+    return new_body
 
-    # 2) draw.io 후보만 처리
-    for att in atts:
-        filename = att.get("title") or (att.get("metadata", {}) or {}).get("filename") or ""
-        labels = {lab["name"] for lab in (att.get("metadata", {}) or {}).get("labels", {}).get("results", [])}
-        media  = (att.get("metadata", {}) or {}).get("mediaType", "") or ""
-        low    = filename.lower()
 
-        is_drawio_label     = "drawio" in labels
-        is_drawio_mediatype = media in {"application/drawio", "application/vnd.jgraph.mxfile"}
-        is_svg              = (media == "image/svg+xml") or low.endswith(".svg")
+def process_drawio_attachments(client: ConfluenceClient, page_id: str,
+                               origin_spaces: List[str], target_space: str,
+                               title_index: Optional[TitleIndex] = None,
+                               cache: Optional[ResolutionCache] = None,
+                               workers: int = 4, server_filter: bool = False,
+                               compress_level: int = DRAWIO_COMPRESS_LEVEL,
+                               attachments: Optional[Iterable[Dict[str, Any]]] = None,
+                               upload: Optional[Callable[[str, Dict[str, Any], str, IO[bytes], str], Any]] = None,
+                               text_cb: Optional[Callable[[Dict[str, Any], str, str], Any]] = None) -> Dict[str, str]:
+    """
+    페이지의 draw.io 후보 첨부를 최대 workers 개씩 동시에 다운로드 → 치환 → 업로드.
+    반환: {첨부 이름: 상태} (updated / nochange / skip / xml-parse-failed:… / error: …), 첨부 목록 순서 유지
 
-        if not (is_drawio_label or is_drawio_mediatype or is_svg or low.endswith(".drawio") or low.endswith(".drawio.svg")):
-            continue
+    attachments : 처리할 후보 첨부 (None 이면 iter_drawio_attachments 로 조회)
+    upload      : upload(page_id, att, filename, fileobj, content_type) 를 새 버전 업로드 대신 호출 (예외면 error)
+    text_cb     : text_cb(att, 치환 전 평문, 치환 후 평문) 를 후보 URL 이 있는 다이어그램 / svg 마다 호출 (워커 스레드에서)
+    cache       : None 이면 호출 동안만 쓰는 메모리 캐시 (묶음 조회(prefetch) 결과를 담아 둠)
+    """
+    if cache is None:
+        cache = ResolutionCache(":memory:")
 
-        try:
-            data, ctype = _download_attachment_via_link(session, BASE_URL, att)
-
-            # .drawio (mxfile) 스타일
-            if is_drawio_mediatype or low.endswith(".drawio") or _looks_like_mxfile(data):
-                status = _process_drawio_file(
-                    session, BASE_URL, page_id, att["id"], filename, data,
-                    lambda url: _rewrite_single_url(url, session, BASE_URL, ORIGIN_SPACES, TARGET_SPACE)
-                )
-            # .svg 스타일
-            elif is_svg or low.endswith(".drawio.svg"):
-                status = _process_drawio_svg(
-                    session, BASE_URL, page_id, att["id"], filename, data,
-                    lambda url: _rewrite_single_url(url, session, BASE_URL, ORIGIN_SPACES, TARGET_SPACE)
-                )
-            else:
-                status = "skip"
-
-            print(f" - draw.io attachment {filename or att.get('id')}: {status}")
+    # 1) 첨부 조회 (라벨/미디어타입 함께) → draw.io 후보만
+    candidates = list(attachments if attachments is not None else iter_drawio_attachments(client, page_id, server_filter))
+    if not candidates:
+        return {}
+
+    def rewrite_cb(url):
+        return _rewrite_single_url(url, client, origin_spaces, target_space, title_index, cache)
+
+    def prefetch_cb(text):
+        page_ids = collect_page_ids(text)
+        if _tiny_offline:
+            page_ids += [pid for pid in map(tiny_page_id, _TINY_URL.findall(text)) if pid]
+        return prefetch_pages(client, cache, page_ids)
 
+    prefilter = candidate_filter(origin_spaces)
+
+    def run(att):
+        att_upload = (lambda filename, data, ctype: upload(page_id, att, filename, data, ctype)) if upload else None
+        att_text_cb = (lambda old, new: text_cb(att, old, new)) if text_cb else None
+        try:
+            return _process_attachment(client, page_id, att, rewrite_cb, prefetch_cb, compress_level, prefilter,
+                                       att_upload, att_text_cb)
         except Exception as e:
-            print(f" - draw.io attachment {filename or att.get('id')}: error: {e}")
+            return f"error: {e}"
 
-    return new_body
+    # 2) 첨부별 처리 (한 첨부의 실패는 해당 첨부 상태로만 기록)
+    if workers <= 1 or len(candidates) == 1:
+        results = [run(att) for att in candidates]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(candidates))) as ex:
+            results = list(ex.map(run, candidates))
+    return {attachment_name(att): status for att, status in zip(candidates, results)}
+
+
+def format_drawio_summary(page_label: str, statuses: Dict[str, str], memo_stats: Optional[str] = None) -> str:
+    """페이지 단위 요약: 상태별 개수 한 줄(+ 실행 누적 URL 메모 적중률) + 변경/오류 첨부 목록"""
+    counts = Counter("error" if s.startswith("error") or s.startswith("xml-parse-failed") else s
+                     for s in statuses.values())
+    lines = [f" - draw.io attachments of {page_label}: " + ", ".join(f"{k} {v}" for k, v in sorted(counts.items()))
+             + (f" [{memo_stats}]" if memo_stats else "")]
+    lines += [f"     {name}: {status}" for name, status in statuses.items() if status not in ("nochange", "skip")]
+    return "\n".join(lines)
 
 
 # ========= 세션/네트워킹 유틸 =========
-def _make_session(headers: Dict[str, str]) -> requests.Session:
-    s = requests.Session()
-    s.headers.update(headers or {})
-    # 간단한 재시도 설정 (과도한 재시도는 지양)
-    try:
-        from requests.adapters import HTTPAdapter
-        from urllib3.util.retry import Retry
-        retry = Retry(
-            total=3, backoff_factor=0.4,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["GET","POST","PUT"]
-        )
-        s.mount("https://", HTTPAdapter(max_retries=retry))
-        s.mount("http://", HTTPAdapter(max_retries=retry))
-    except Exception:
-        pass
-    return s
+_clients: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], ConfluenceClient] = {}
 
-def _list_attachments(session: requests.Session, base_url: str, page_id: str, limit: int = 500):
-    url = f"{base_url}/rest/api/content/{page_id}/child/attachment?limit={limit}&expand=metadata.labels,metadata.mediaType"
-    r = session.get(url, headers={"Accept": "application/json"})
-    r.raise_for_status()
-    return r.json().get("results", [])
+def _get_client(base_url: str, headers: Dict[str, str]) -> ConfluenceClient:
+    """client 를 넘기지 않은 호출용: (base_url, headers) 별 클라이언트를 재사용 (호출마다 새 세션 생성 방지)"""
+    key = (base_url, tuple(sorted((headers or {}).items())))
+    client = _clients.get(key)
+    if client is None:
+        client = _clients[key] = ConfluenceClient(base_url, headers=headers)
+    return client
 
-def _download_attachment_via_link(session: requests.Session, base_url: str, att: Dict[str, Any]):
+ATTACHMENT_EXPAND = "metadata.labels,metadata.mediaType,version"  # 판별용 라벨/미디어타입 + 첨부 버전(변경 확인용)
+
+def iter_drawio_attachments(client: ConfluenceClient, page_id: str,
+                            server_filter: bool = False, page_size: int = 100) -> Iterator[Dict[str, Any]]:
+    """
+    draw.io 후보 첨부만 페이지 단위로 받으며 yield (첨부 목록 전체를 메모리에 올리지 않음).
+    server_filter=True 면 DRAWIO_MEDIA_TYPES 별로 서버에서 mediaType 필터링 → PDF/이미지 목록은 받지 않음
+    (단, 미디어타입이 다른데 라벨/확장자로만 draw.io 인 첨부는 빠짐)
+    """
+    if not server_filter:
+        for att in client.attachments(page_id, expand=ATTACHMENT_EXPAND, page_size=page_size):
+            if _is_drawio_candidate(att):
+                yield att
+        return
+
+    seen = set()
+    for media_type in DRAWIO_MEDIA_TYPES:
+        for att in client.attachments(page_id, expand=ATTACHMENT_EXPAND,
+                                      page_size=page_size, media_type=media_type):
+            if att["id"] not in seen and _is_drawio_candidate(att):
+                seen.add(att["id"])
+                yield att
+
+def _download_attachment_via_link(client: ConfluenceClient, att: Dict[str, Any]):
     """
     첨부 객체의 _links.download 를 사용해 안전하게 다운로드.
-    base_url 은 컨텍스트(/confluence, /wiki 포함)까지 들어간 값을 넘기세요.
+    client.base_url 은 컨텍스트(/confluence, /wiki 포함)까지 들어간 값이어야 함.
+    본문은 CHUNK_SIZE 단위로 받아 SpooledTemporaryFile 에 기록 (SPOOL_MAX_SIZE 를 넘으면 디스크로) → 파일 객체 반환.
     """
-    links = att.get("_links", {}) or {}
-    dl_path = links.get("download")  # 예: "/download/attachments/12345/diagram?version=2&api=v2"
-    if not dl_path:
-        raise RuntimeError(f"No download link in attachment: {att.get('id')}")
-
-    url = urljoin(base_url if base_url.endswith("/") else base_url + "/", dl_path.lstrip("/"))
-    r = session.get(url, allow_redirects=True)
-    if r.status_code == 404:
-        # 일부 인스턴스는 컨텍스트 경로 이슈로 루트(host) 기준이 필요한 경우가 있음
-        from urllib.parse import urlparse
-        p = urlparse(base_url)
-        host_root = f"{p.scheme}://{p.netloc}"
-        url2 = urljoin(host_root + "/", dl_path.lstrip("/"))
-        r = session.get(url2, allow_redirects=True)
-
-    r.raise_for_status()
-    return r.content, r.headers.get("Content-Type", "")
-
-def _upload_new_attachment_version(session: requests.Session, base_url: str, page_id: str,
-                                   attachment_id: str, filename: str, data: bytes, content_type: str):
-    url = f"{base_url}/rest/api/content/{page_id}/child/attachment/{attachment_id}/data"
-    files = {'file': (filename or "diagram.drawio", data, content_type or 'application/octet-stream')}
-    r = session.post(url, files=files)
-    r.raise_for_status()
-    return r.json()
-
-def _get_json(session: requests.Session, url: str):
-    r = session.get(url, headers={"Accept": "application/json"})
-    r.raise_for_status()
-    return r.json()
+    r = client.download_attachment(att, stream=True)
+    f = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        for chunk in r.iter_content(CHUNK_SIZE):
+            f.write(chunk)
+    except Exception:
+        f.close()
+        raise
+    finally:
+        r.close()
+    f.seek(0)
+    return f, r.headers.get("Content-Type", "")
+
+def _upload_new_attachment_version(client: ConfluenceClient, page_id: str,
+                                   attachment_id: str, filename: str, data: Union[bytes, IO[bytes]], content_type: str,
+                                   upload: Optional[Callable[[str, Union[bytes, IO[bytes]], str], Any]] = None):
+    if upload is not None:
+        return upload(filename, data, content_type)  # 호출 쪽 업로드 (plan 모드 기록 등)
+    return client.upload_attachment(page_id, attachment_id, filename, data, content_type)
 
 
 # ========= URL 해석/치환 =========
-def _q(s: str) -> str:
-    try:
-        return requests.utils.quote(s, safe="")
-    except Exception:
-        return s
+_tiny_offline = False  # set_tiny_offline(True) 면 tiny 코드를 로컬 디코딩
+_TINY_URL = re.compile(r"/x/[A-Za-z0-9_-]+")
+
+def set_tiny_offline(enabled: bool) -> None:
+    """tiny /x/CODE → page id 를 리다이렉트 대신 tiny_code 로 디코딩 (tiny_code.codec_matches 로 확인한 뒤 켤 것)"""
+    global _tiny_offline
+    _tiny_offline = enabled
+
+_cpu_pool = None  # set_cpu_pool 로 지정한 cpu_pool.CpuPool (없으면 현재 스레드에서 해제/재압축)
+
+def set_cpu_pool(pool) -> None:
+    """
+    <diagram> payload 해제/재압축을 보낼 프로세스 풀 지정 (cpu_pool.CpuPool, None 이면 해제).
+    첨부 처리 스레드(workers)가 결과를 기다리는 동안 다른 첨부는 계속 진행 → workers 를 프로세스 수 이상으로.
+    """
+    global _cpu_pool
+    _cpu_pool = pool
+
+def _cpu_run(fn, *args):
+    return _cpu_pool.run(fn, *args) if _cpu_pool is not None else fn(*args)
+
+rewrite_memo = RewriteMemo()  # 실행 동안 URL → 치환 결과(None 포함) 기억, 적중률은 rewrite_memo.format_stats()
+_inflight = SingleFlight()  # 동시에 들어온 같은 조회(제목/page id/tiny)는 HTTP 한 번으로 합침
 
 def _normalize_url(u: str, base_url: str) -> str:
     if u.startswith("/"):
@@ -168,91 +272,248 @@ def _decode_title_slug(s: str) -> str:
     # + 또는 % 인코딩 혼재
     return unquote_plus(s)
 
-def _find_content_by_title(session: requests.Session, base_url: str, space_key: str, title: str):
-    url = f'{base_url}/rest/api/content?spaceKey={_q(space_key)}&title={_q(title)}&expand=version'
-    data = _get_json(session, url)
-    results = data.get("results", [])
-    return results[0] if results else None
-
-def _get_content_by_id(session: requests.Session, base_url: str, page_id: str, expand="space,title"):
-    url = f"{base_url}/rest/api/content/{page_id}?expand={expand}"
-    return _get_json(session, url)
-
-def _extract_pageid_from_url(url: str, session: requests.Session, base_url: str) -> Optional[str]:
+def _find_content_by_title(client: ConfluenceClient, space_key: str, title: str,
+                           title_index: Optional[TitleIndex] = None,
+                           cache: Optional[ResolutionCache] = None) -> Optional[Dict[str, Any]]:
+    """제목 → page info(id/title/webui/tinyui). 인덱스 → 영구 캐시 → 라이브 검색 순."""
+    def live(t):
+        return _inflight.do(("title", client.base_url, space_key, t), lambda: _search_title(t))
+
+    def _search_title(t):
+        if cache is not None:
+            hit, info = cache.get_target(client.base_url, space_key, t)
+            if hit:
+                return info
+        found = client.find_content_by_title(space_key, t)
+        info = page_info_from_content(found) if found else None
+        if cache is not None:
+            cache.put_target(client.base_url, space_key, t, info)
+        return info
+
+    if title_index is not None:
+        return lookup_title(title_index, title, live)
+    return live(title)
+
+def _get_space_title_by_id(client: ConfluenceClient, page_id: str,
+                           cache: Optional[ResolutionCache] = None) -> Optional[Tuple[str, str]]:
+    """pageId → (space, title). 404 는 None (캐시에 negative 로 기록)."""
+    return _inflight.do(("page", client.base_url, page_id), lambda: _fetch_space_title(client, page_id, cache))
+
+def _fetch_space_title(client: ConfluenceClient, page_id: str,
+                       cache: Optional[ResolutionCache] = None) -> Optional[Tuple[str, str]]:
+    if cache is not None:
+        hit, v = cache.get_page(client.base_url, page_id)
+        if hit:
+            return (v["space"], v["title"]) if v else None
+    try:
+        src = client.get_content(page_id, expand="space")
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            if cache is not None:
+                cache.put_page(client.base_url, page_id, None, None)
+            return None
+        raise
+    space_key, title = src["space"]["key"], src["title"]
+    if cache is not None:
+        cache.put_page(client.base_url, page_id, space_key, title)
+    return space_key, title
+
+def _resolve_tiny_url(url: str, client: ConfluenceClient, cache: Optional[ResolutionCache] = None) -> Optional[str]:
+    """tiny /x/... → 리다이렉트 최종 URL. 404 는 None."""
+    return _inflight.do(("tiny", client.base_url, url), lambda: _follow_tiny_url(url, client, cache))
+
+def _follow_tiny_url(url: str, client: ConfluenceClient, cache: Optional[ResolutionCache] = None) -> Optional[str]:
+    if cache is not None:
+        hit, v = cache.get_tiny(client.base_url, url)
+        if hit:
+            return v["url"] if v else None
+    final = client.resolve_tiny(url)
+    if cache is not None:
+        cache.put_tiny(client.base_url, url, final, final.split("/")[-1].replace("+", " ") if final else None)
+    return final
+
+def _extract_pageid_from_url(url: str, client: ConfluenceClient, cache: Optional[ResolutionCache] = None) -> Optional[str]:
+    """
+    URL → page id. 페이지를 가리키지 않는 URL 은 None.
+    조회 오류(일시 오류 포함)는 예외로 전달 → None 으로 바뀌어 메모/캐시에 negative 로 남지 않도록.
+    """
     try:
         p = urlparse(url)
-        q = parse_qs(p.query or "")
-
-        # case 1) ?pageId=123
-        if "pageId" in q:
-            return q["pageId"][0]
-
-        # case 2) /display/SPACE/TITLE
-        if "/display/" in p.path:
-            m = re.search(r"/display/([^/]+)/(.+)$", p.path)
-            if m:
-                space = m.group(1)
-                title = _decode_title_slug(m.group(2))
-                page = _find_content_by_title(session, base_url, space, title)
-                return page["id"] if page else None
-
-        # case 3) tiny /x/.... -> 리다이렉트 따라가 최종 URL 재해석
-        if re.search(r"/x/[A-Za-z0-9]+", p.path):
-            r = session.get(url, allow_redirects=True)
-            return _extract_pageid_from_url(r.url, session, base_url)
-    except Exception:
-        return None
+    except ValueError:
+        return None  # 잘못된 URL (예: 깨진 IPv6 host) 은 항상 같은 결과
+    q = parse_qs(p.query or "")
+
+    # case 1) ?pageId=123
+    if "pageId" in q:
+        return q["pageId"][0]
+
+    # case 2) /display/SPACE/TITLE
+    if "/display/" in p.path:
+        m = re.search(r"/display/([^/]+)/(.+)$", p.path)
+        if m:
+            space = m.group(1)
+            title = _decode_title_slug(m.group(2))
+            page = _find_content_by_title(client, space, title, cache=cache)
+            return page["id"] if page else None
+
+    # case 3) tiny /x/.... -> 로컬 디코딩 (페이지가 있을 때만) 또는 리다이렉트 따라가 최종 URL 재해석
+    if re.search(r"/x/[A-Za-z0-9]+", p.path):
+        page_id = tiny_page_id(p.path) if _tiny_offline else None
+        if page_id and _get_space_title_by_id(client, page_id, cache):
+            return page_id
+        final = _resolve_tiny_url(url, client, cache)
+        return _extract_pageid_from_url(final, client, cache) if final else None
     return None
 
-def _build_target_url_by_title(session: requests.Session, base_url: str, target_space: str, title: str) -> Optional[str]:
-    tgt = _find_content_by_title(session, base_url, target_space, title)
+def _build_target_url_by_title(client: ConfluenceClient, target_space: str, title: str,
+                               title_index: Optional[TitleIndex] = None,
+                               cache: Optional[ResolutionCache] = None) -> Optional[str]:
+    tgt = _find_content_by_title(client, target_space, title, title_index, cache)
     if not tgt:
         return None
-    return f"{base_url}/pages/viewpage.action?pageId={tgt['id']}"
+    return f"{client.base_url}/pages/viewpage.action?pageId={tgt['id']}"
 
-def _build_target_url_by_pageid(session: requests.Session, base_url: str,
-                                origin_spaces: List[str], target_space: str, src_page_id: str) -> Optional[str]:
-    src = _get_content_by_id(session, base_url, src_page_id, expand="space,title")
-    space_key = src["space"]["key"]
-    title = src["title"]
+def _build_target_url_by_pageid(client: ConfluenceClient, origin_spaces: List[str], target_space: str, src_page_id: str,
+                                title_index: Optional[TitleIndex] = None,
+                                cache: Optional[ResolutionCache] = None) -> Optional[str]:
+    src = _get_space_title_by_id(client, src_page_id, cache)
+    if not src:
+        return None
+    space_key, title = src
     if space_key not in origin_spaces:
         return None
-    return _build_target_url_by_title(session, base_url, target_space, title)
+    return _build_target_url_by_title(client, target_space, title, title_index, cache)
 
 def _rewrite_single_url(old_url: str,
-                        session: requests.Session,
-                        base_url: str,
-                        origin_spaces: List[str],
-                        target_space: str) -> Optional[str]:
+                        client: ConfluenceClient, origin_spaces: List[str],
+                        target_space: str,
+                        title_index: Optional[TitleIndex] = None,
+                        cache: Optional[ResolutionCache] = None) -> Optional[str]:
     """
     old_url → (ORIGIN_SPACES → TARGET_SPACE 동일 제목) 새 URL.
     매핑 실패 시 None.
+    결과(None 포함)는 정규화한 URL 기준으로 rewrite_memo 에 기억 → 실행 동안 같은 URL 은 한 번만 해석.
+    조회 오류는 기억하지 않고 예외로 전달 → 첨부 상태가 error 가 되어 업로드/완료 기록 없이 다음 실행에서 다시 처리.
     """
-    try:
-        u = _normalize_url(old_url, base_url)
-        pid = _extract_pageid_from_url(u, session, base_url)
-        if pid:
-            new_u = _build_target_url_by_pageid(session, base_url, origin_spaces, target_space, pid)
-            if new_u:
-                return new_u
-
-        # pageId 미검출: /display/ORG/TITLE 직접 매핑
-        p = urlparse(u)
-        m = re.search(r"/display/([^/]+)/(.+)$", p.path or "")
-        if m and m.group(1) in origin_spaces:
-            title = _decode_title_slug(m.group(2))
-            tgt = _build_target_url_by_title(session, base_url, target_space, title)
-            if tgt:
-                return tgt
+    u, _ = urldefrag(_normalize_url(old_url, client.base_url))  # #anchor 는 해석 결과와 무관
+    key = (client.base_url, tuple(origin_spaces), target_space, u)
+    hit, new_u = rewrite_memo.get(key)
+    if hit:
+        return new_u
+    # 다른 워커가 같은 URL 을 해석 중이면 그 결과(또는 예외)를 받음
+    new_u = _inflight.do(("rewrite",) + key, lambda: _resolve_single_url(
+        u, client, origin_spaces, target_space, title_index, cache))
+    rewrite_memo.put(key, new_u)
+    if new_u and target_space not in origin_spaces:
+        # 치환된 URL 은 다시 만나도(평문 URL 패스 등) 바꿀 것이 없음
+        rewrite_memo.put((client.base_url, tuple(origin_spaces), target_space, new_u), None)
+    return new_u
+
+def _resolve_single_url(u: str,
+                        client: ConfluenceClient, origin_spaces: List[str],
+                        target_space: str,
+                        title_index: Optional[TitleIndex] = None,
+                        cache: Optional[ResolutionCache] = None) -> Optional[str]:
+    """정규화된 URL u 를 실제로 해석 (메모 없이). 조회 오류는 예외로 전달."""
+    pid = _extract_pageid_from_url(u, client, cache)
+    if pid:
+        new_u = _build_target_url_by_pageid(client, origin_spaces, target_space, pid, title_index, cache)
+        if new_u:
+            return new_u
+
+    # pageId 미검출: /display/ORG/TITLE 직접 매핑
+    p = urlparse(u)
+    m = re.search(r"/display/([^/]+)/(.+)$", p.path or "")
+    if m and m.group(1) in origin_spaces:
+        title = _decode_title_slug(m.group(2))
+        tgt = _build_target_url_by_title(client, target_space, title, title_index, cache)
+        if tgt:
+            return tgt
 
-        return None
-    except Exception:
-        return None
+    return None
 
 
 # ========= draw.io 파일 처리 =========
+def attachment_name(att: Dict[str, Any]) -> str:
+    return att.get("title") or (att.get("metadata", {}) or {}).get("filename") or att.get("id") or ""
+
+def _is_drawio_candidate(att: Dict[str, Any]) -> bool:
+    """라벨(drawio) / 미디어타입 / 확장자 기준 draw.io 첨부 후보 여부"""
+    filename = att.get("title") or (att.get("metadata", {}) or {}).get("filename") or ""
+    labels = {lab["name"] for lab in (att.get("metadata", {}) or {}).get("labels", {}).get("results", [])}
+    media  = (att.get("metadata", {}) or {}).get("mediaType", "") or ""
+    low    = filename.lower()
+
+    is_drawio_label     = "drawio" in labels
+    is_drawio_mediatype = media in {"application/drawio", "application/vnd.jgraph.mxfile"}
+    is_svg              = (media == "image/svg+xml") or low.endswith(".svg")
+
+    return is_drawio_label or is_drawio_mediatype or is_svg or low.endswith(".drawio") or low.endswith(".drawio.svg")
+
+def _attachment_format(att: Dict[str, Any], head: bytes) -> Optional[str]:
+    """다운로드한 첨부의 형식: "drawio"(mxfile) / "svg" / None(처리 안 함)"""
+    filename = att.get("title") or (att.get("metadata", {}) or {}).get("filename") or ""
+    media = (att.get("metadata", {}) or {}).get("mediaType", "") or ""
+    low = filename.lower()
+    if media in {"application/drawio", "application/vnd.jgraph.mxfile"} or low.endswith(".drawio") or _looks_like_mxfile(head):
+        return "drawio"
+    if (media == "image/svg+xml") or low.endswith(".svg") or low.endswith(".drawio.svg"):
+        return "svg"
+    return None
+
+def _process_attachment(client: ConfluenceClient, page_id: str, att: Dict[str, Any],
+                        rewrite_cb: Callable[[str], Optional[str]],
+                        prefetch_cb: Optional[Callable[[str], Any]] = None,
+                        compress_level: int = DRAWIO_COMPRESS_LEVEL,
+                        prefilter: Callable[[str], bool] = _default_filter,
+                        upload: Optional[Callable[[str, Union[bytes, IO[bytes]], str], Any]] = None,
+                        text_cb: Optional[Callable[[str, str], Any]] = None) -> str:
+    """후보 첨부 하나: 다운로드 → 형식(.drawio / .svg)별 치환 → 변경 시 업로드. 상태 문자열 반환."""
+    filename = att.get("title") or (att.get("metadata", {}) or {}).get("filename") or ""
+
+    data, ctype = _download_attachment_via_link(client, att)
+    with data:
+        head = data.read(2048)
+        data.seek(0)
+        fmt = _attachment_format(att, head)
+        # .drawio (mxfile) 스타일
+        if fmt == "drawio":
+            return _process_drawio_file(client, page_id, att["id"], filename, data, rewrite_cb, prefetch_cb,
+                                        compress_level, prefilter, upload, text_cb)
+        # .svg 스타일
+        if fmt == "svg":
+            return _process_drawio_svg(client, page_id, att["id"], filename, data, rewrite_cb, prefetch_cb, prefilter,
+                                       upload, text_cb)
+    return "skip"
+
+class _Discard:
+    """치환 없이 훑기만 할 때(_splice_mxfile_stream) 출력 버림"""
+    def write(self, b) -> int:
+        return len(b)
+
+def scan_drawio_attachment(client: ConfluenceClient, att: Dict[str, Any],
+                           prefilter: Callable[[str], bool] = _default_filter) -> List[str]:
+    """
+    후보 첨부 하나를 스트리밍 다운로드해 후보 URL 이 있는 다이어그램 평문(압축 해제) / svg 텍스트 목록 반환.
+    치환/조회/업로드 없음 (2단계 실행 scan 단계에서 해석할 링크 수집용). 빈 목록이면 치환할 것이 없는 첨부.
+    """
+    texts: List[str] = []
+    data, ctype = _download_attachment_via_link(client, att)
+    with data:
+        head = data.read(2048)
+        data.seek(0)
+        fmt = _attachment_format(att, head)
+        if fmt == "drawio":
+            _splice_mxfile_stream(data, _Discard(), None, prefilter=prefilter,
+                                  text_cb=lambda old, new: texts.append(old))
+        elif fmt == "svg":
+            text = data.read().decode("utf-8", errors="replace")
+            if prefilter(text):
+                texts.append(text)
+    return texts
+
 def _looks_like_mxfile(data: bytes) -> bool:
-    # 간단 휴리스틱: <mxfile …> 헤더 확인
+    # 간단 휴리스틱: <mxfile …> 헤더 확인 (앞부분 바이트만 넘겨도 됨)
     head = data[:2048].decode("utf-8", errors="ignore")
     return "<mxfile" in head
 
@@ -268,8 +529,8 @@ def _try_decompress_drawio_payload(s: str) -> Tuple[str, bool]:
     except Exception:
         return s, False
 
-def _compress_drawio_payload(s: str) -> str:
-    co = zlib.compressobj(level=9, wbits=-15)
+def _compress_drawio_payload(s: str, level: int = DRAWIO_COMPRESS_LEVEL) -> str:
+    co = zlib.compressobj(level=level, wbits=-15)
     data = co.compress(s.encode("utf-8")) + co.flush()
     return base64.b64encode(data).decode("ascii")
 
@@ -303,43 +564,163 @@ def _rewrite_urls_in_text_with_cb(text: str, rewrite_cb: Callable[[str], Optiona
 
     return out
 
-def _process_drawio_file(session: requests.Session, base_url: str, page_id: str,
-                         att_id: str, filename: str, data: bytes, rewrite_cb: Callable[[str], Optional[str]]) -> str:
+def _process_drawio_file(client: ConfluenceClient, page_id: str,
+                         att_id: str, filename: str, data: IO[bytes], rewrite_cb: Callable[[str], Optional[str]],
+                         prefetch_cb: Optional[Callable[[str], Any]] = None,
+                         compress_level: int = DRAWIO_COMPRESS_LEVEL,
+                         prefilter: Callable[[str], bool] = _default_filter,
+                         upload: Optional[Callable[[str, Union[bytes, IO[bytes]], str], Any]] = None,
+                         text_cb: Optional[Callable[[str, str], Any]] = None) -> str:
     """
     .drawio(xml): <mxfile><diagram>payload</diagram></mxfile>
     payload이 압축이면 해제 → 치환 → 원형(압축/평문) 복원 후 업로드.
+    data(파일 객체)에서 <diagram> payload 구간만 찾아 치환하고 나머지 바이트는 그대로 임시 파일에 복사
+    → 바뀐 다이어그램 외에는 원본과 바이트 단위로 동일, 메모리에는 다이어그램 하나 분량만. 업로드도 임시 파일에서 스트리밍.
     """
-    xml = data.decode("utf-8", errors="replace")
-    try:
-        root = ET.fromstring(xml)
-    except Exception as e:
-        return f"xml-parse-failed:{e}"
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    with out:
+        changed = _splice_mxfile_stream(data, out, rewrite_cb, prefetch_cb, compress_level, prefilter, text_cb)
+        if not changed:
+            return "nochange"
+
+        out.seek(0)
+        _upload_new_attachment_version(client, page_id, att_id, filename, out, "application/xml", upload)
+    return "updated"
 
+def candidate_filter(origin_spaces: List[str]) -> KeywordFilter:
+    """
+    rewrite_cb 가 바꿀 수 있는 URL 의 키워드(pageId= / /display/{ORIGIN}/ / tiny /x/) 필터.
+    /display/ 는 ORIGIN 공간만 매핑되므로(다른 공간 제목은 해석해도 None) 설정의 공간 키로 좁힘.
+    """
+    return KeywordFilter(["pageId=", "/x/"] + [f"/display/{s}/" for s in origin_spaces])
+
+def _rewrite_diagram_payload(payload: bytes, rewrite_cb: Optional[Callable[[str], Optional[str]]],
+                             prefetch_cb: Optional[Callable[[str], Any]] = None,
+                             compress_level: int = DRAWIO_COMPRESS_LEVEL,
+                             prefilter: Callable[[str], bool] = _default_filter,
+                             text_cb: Optional[Callable[[str, str], Any]] = None) -> Optional[bytes]:
+    """
+    <diagram> 의 원본 payload 바이트 → 치환된 payload 바이트. 바꿀 것이 없으면 None (원본 그대로 사용).
+    text_cb(치환 전 평문, 치환 후 평문) 는 후보 URL 이 있는 다이어그램마다 호출, rewrite_cb 가 None 이면 훑기만 함.
+    - 압축이 아닌 자식 요소 형식(<diagram><mxGraphModel>…)은 텍스트 payload 가 없으므로 건드리지 않음
+    - 후보 URL 이 없는 다이어그램은 prefetch/치환/재압축 모두 생략
+      (압축 안 된 평문 payload 는 escape 해제/압축 해제 시도 전에, 압축 payload 는 해제 직후 prefilter 로 판정)
+    해제/재압축(CPU)은 set_cpu_pool 로 지정한 프로세스 풀에서, URL 치환(조회)은 이 스레드에서.
+    """
+    decoded = _cpu_run(decode_diagram_payload, payload, prefilter)
+    if decoded is None:
+        return None
+    plain, was_compressed = decoded
+    if prefetch_cb is not None:
+        prefetch_cb(plain)  # 다이어그램 단위로 pageId 묶음 조회
+    new_plain = _rewrite_urls_in_text_with_cb(plain, rewrite_cb) if rewrite_cb is not None else plain
+    if text_cb is not None:
+        text_cb(plain, new_plain)
+    if new_plain == plain:
+        return None
+    return _cpu_run(encode_diagram_payload, new_plain, was_compressed, compress_level)
+
+def decode_diagram_payload(payload: bytes, prefilter: Callable[[str], bool] = _default_filter) -> Optional[Tuple[str, bool]]:
+    """payload 바이트 → (평문 다이어그램 XML, 압축 여부). 치환할 후보가 없으면 None. (CPU 전용, 프로세스 풀 작업)"""
+    text = payload.decode("utf-8", errors="replace")
+    if "<" in text:
+        return None
+    if "&" in text and not prefilter(text):  # base64 에는 없는 문자 → 평문(escape 된 XML)
+        return None
+    plain, was_compressed = _try_decompress_drawio_payload(html.unescape(text))
+    if not prefilter(plain):
+        return None
+    return plain, was_compressed
+
+def encode_diagram_payload(plain: str, was_compressed: bool, compress_level: int = DRAWIO_COMPRESS_LEVEL) -> bytes:
+    """치환된 평문 → 원래 형식(압축 / escape 평문)의 payload 바이트. (CPU 전용, 프로세스 풀 작업)"""
+    new_text = _compress_drawio_payload(plain, compress_level) if was_compressed else escape(plain)
+    return new_text.encode("utf-8")
+
+def _splice_mxfile_stream(src: IO[bytes], dst: IO[bytes],
+                          rewrite_cb: Optional[Callable[[str], Optional[str]]],
+                          prefetch_cb: Optional[Callable[[str], Any]] = None,
+                          compress_level: int = DRAWIO_COMPRESS_LEVEL,
+                          prefilter: Callable[[str], bool] = _default_filter,
+                          text_cb: Optional[Callable[[str, str], Any]] = None) -> bool:
+    """
+    src 를 CHUNK_SIZE 씩 읽으며 <diagram …>payload</diagram> 구간을 찾아 payload 만 바꿔 dst 에 기록.
+    태그/속성/공백/다른 요소 등 그 밖의 바이트는 그대로 통과. 변경 여부 반환.
+    """
     changed = False
-    for diagram in root.findall(".//diagram"):
-        payload = diagram.text or ""
-        plain, was_compressed = _try_decompress_drawio_payload(payload)
-        new_plain = _rewrite_urls_in_text_with_cb(plain, rewrite_cb)
-        if new_plain != plain:
-            changed = True
-            diagram.text = _compress_drawio_payload(new_plain) if was_compressed else new_plain
+    buf = bytearray()
+    eof = False
+
+    def fill():
+        nonlocal eof
+        chunk = src.read(CHUNK_SIZE)
+        if chunk:
+            buf.extend(chunk)
+        else:
+            eof = True
+
+    while True:
+        i = buf.find(_DIAGRAM_OPEN)
+        if i < 0:
+            if eof:
+                dst.write(buf)
+                return changed
+            keep = len(_DIAGRAM_OPEN) - 1  # 청크 경계에 걸친 "<diagra" 는 남겨 둠
+            if len(buf) > keep:
+                dst.write(buf[:-keep])
+                del buf[:-keep]
+            fill()
+            continue
 
-    if not changed:
-        return "nochange"
+        # 시작 태그 끝('>')과 닫는 태그까지 버퍼에 모일 때까지 읽기 (다이어그램 하나 분량)
+        j = buf.find(b">", i)
+        k = buf.find(_DIAGRAM_CLOSE, j) if j >= 0 else -1
+        self_closing = j >= 0 and buf[j - 1:j] == b"/"
+        if j < 0 or (k < 0 and not self_closing):
+            if eof:  # 닫히지 않은 태그: 그대로 기록
+                dst.write(buf)
+                return changed
+            fill()
+            continue
 
-    new_bytes = ET.tostring(root, encoding="utf-8", method="xml")
-    _upload_new_attachment_version(session, base_url, page_id, att_id, filename, new_bytes, "application/xml")
-    return "updated"
+        name_end = buf[i + len(_DIAGRAM_OPEN):i + len(_DIAGRAM_OPEN) + 1]
+        if self_closing or name_end not in (b" ", b"\t", b"\r", b"\n", b">"):
+            # <diagram/> 또는 <diagramXxx …> 같은 다른 태그: 시작 태그까지 그대로
+            dst.write(buf[:j + 1])
+            del buf[:j + 1]
+            continue
 
-def _process_drawio_svg(session: requests.Session, base_url: str, page_id: str,
-                        att_id: str, filename: str, data: bytes, rewrite_cb: Callable[[str], Optional[str]]) -> str:
+        payload = bytes(buf[j + 1:k])
+        new_payload = _rewrite_diagram_payload(payload, rewrite_cb, prefetch_cb, compress_level, prefilter, text_cb)
+        dst.write(buf[:j + 1])
+        if new_payload is None:
+            dst.write(payload)
+        else:
+            dst.write(new_payload)
+            changed = True
+        dst.write(_DIAGRAM_CLOSE)
+        del buf[:k + len(_DIAGRAM_CLOSE)]
+
+def _process_drawio_svg(client: ConfluenceClient, page_id: str,
+                        att_id: str, filename: str, data: IO[bytes], rewrite_cb: Callable[[str], Optional[str]],
+                        prefetch_cb: Optional[Callable[[str], Any]] = None,
+                        prefilter: Callable[[str], bool] = _default_filter,
+                        upload: Optional[Callable[[str, Union[bytes, IO[bytes]], str], Any]] = None,
+                        text_cb: Optional[Callable[[str, str], Any]] = None) -> str:
     """
     .svg(XML) 텍스트 기반 치환 후 업로드.
+    (svg 는 문서 전체가 한 덩어리(content 속성)라 텍스트 전체를 읽어 치환)
     """
-    text = data.decode("utf-8", errors="replace")
+    text = data.read().decode("utf-8", errors="replace")
+    if not prefilter(text):
+        return "nochange"
+    if prefetch_cb is not None:
+        prefetch_cb(text)
     new_text = _rewrite_urls_in_text_with_cb(text, rewrite_cb)
+    if text_cb is not None:
+        text_cb(text, new_text)
     if new_text == text:
         return "nochange"
-    _upload_new_attachment_version(session, base_url, page_id, att_id, filename,
-                                   new_text.encode("utf-8"), "image/svg+xml")
+    _upload_new_attachment_version(client, page_id, att_id, filename,
+                                   new_text.encode("utf-8"), "image/svg+xml", upload)
     return "updated"
@@ -1,4 +1,4 @@
-import requests
+from confluence_client import ConfluenceClient
 
 # 설정
 BASE_URL = "https://yourcompany.atlassian.net/wiki"   # 또는 내부 도메인
@@ -8,11 +8,12 @@ PAGE_ID = "123456789"  # 테스트할 Confluence 페이지 ID
 
 # 인증
 auth = (EMAIL, API_TOKEN)
+client = ConfluenceClient(BASE_URL, auth=auth)
 
 # 요청
 url = f"{BASE_URL}/rest/api/content/{PAGE_ID}"
 
-response = requests.get(url, auth=auth)
+response = client.get(url)
 
 # 결과 출력
 if response.status_code == 200:
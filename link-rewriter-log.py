@@ -1,4 +1,9 @@
-import requests, re, csv, time
+import re
+from collections import Counter
+from page_runner import run_pages
+from confluence_client import ConfluenceClient
+from space_crawler import iter_space_pages
+from link_map_log import StreamingCsvLog, counted_rows, LINK_MAP_FIELDS, SHORT_URL_FIELDS
 
 # 설정
 USERNAME = 'your.email@example.com'
@@ -8,22 +13,22 @@ ORIGIN_SPACES = ['SPACE_A1', 'SPACE_A2', 'SPACE_A3']
 TARGET_SPACE = 'SPACE_B'
 auth = (USERNAME, API_TOKEN)
 headers = {'Content-Type': 'application/json'}
+WORKERS = 1  # 동시에 처리할 페이지 수 (1 이면 순차 처리)
+client = ConfluenceClient(BASE_URL, headers=headers, auth=auth, pool_size=max(10, WORKERS * 2))  # keep-alive 풀 + 재시도 + timeout
 
-short_url_records = []
-link_map_records = []
+LINK_MAP_PATH = 'link_map.csv'      # .gz 로 끝나면 gzip 압축 (예: link_map.csv.gz)
+SHORT_URL_PATH = 'short_urls.csv'
+link_map_log = None   # __main__ 에서 여는 StreamingCsvLog (페이지 단위로 바로 기록)
+short_url_log = None
+
+# ORIGIN_SPACES 의 display / spaces 링크를 한 번에 찾는 패턴 (치환과 로그 집계를 같은 패스에서)
+_origin = "|".join(re.escape(space) for space in ORIGIN_SPACES)
+LINK_PATTERN = re.compile(rf'/display/(?P<display>{_origin})/|/spaces/(?P<spaces>{_origin})/pages/')
+SHORT_URL_PATTERN = re.compile(r'(https?://[^"]+)?(/wiki)?/x/[a-zA-Z0-9]+')
 
 def get_all_page_ids(space_key):
-    ids = []
-    start = 0
-    while True:
-        url = f"{BASE_URL}/rest/api/content?spaceKey={space_key}&limit=50&start={start}&expand=version"
-        res = requests.get(url, auth=auth)
-        results = res.json().get("results", [])
-        if not results: break
-        for page in results:
-            ids.append((page['id'], page['title']))
-        start += 50
-    return ids
+    # 최대 page size + _links.next 로 공간 전체 목록 (space_crawler)
+    return [(page['id'], page['title']) for page in iter_space_pages(client, [space_key], expand="version")]
 
 def get_child_pages(parent_id):
     """지정한 페이지 ID 이하의 모든 하위 페이지 ID+제목 리스트 반환"""
@@ -33,7 +38,7 @@ def get_child_pages(parent_id):
     while stack:
         current_id = stack.pop()
         url = f"{BASE_URL}/rest/api/content/{current_id}?expand=children.page"
-        res = requests.get(url, auth=auth)
+        res = client.get(url)
         if res.status_code != 200:
             print(f"❌ Failed to get children of {current_id}")
             continue
@@ -48,75 +53,53 @@ def get_child_pages(parent_id):
     return pages
 
 def detect_short_urls(body, title, page_id):
-    matches = re.findall(r'(https?://[^"]+)?(/wiki)?/x/[a-zA-Z0-9]+', body)
-    for m in matches:
-        partial = "".join(m)
-        short_url = f"{BASE_URL}{partial}" if partial.startswith('/x') or '/wiki/x' in partial else partial
-        short_url_records.append((title, page_id, short_url))
-        # 로그도 함께 남김
-        link_map_records.append({
-            'page_id': page_id,
-            'page_title': title,
-            'from_text': short_url,
-            'from_type': 'short',
-            'to_text': 'N/A',
-            'to_type': 'N/A',
-            'status': 'short_logged',
-            'note': 'short URL recorded only'
-        })
+    counts = Counter()
+    for m in SHORT_URL_PATTERN.finditer(body):
+        partial = m.group(0)
+        short_url = f"{BASE_URL}{partial}" if partial.startswith('/') else partial
+        counts[short_url] += 1
+    if not counts:
+        return
+
+    if short_url_log:
+        short_url_log.write_rows({'title': title, 'page_id': page_id, 'short_url': url, 'count': n}
+                                 for url, n in counts.items())
+    # 로그도 함께 남김
+    if link_map_log:
+        link_map_log.write_rows(counted_rows(
+            {'page_id': page_id, 'page_title': title},
+            Counter({(url, 'short', 'N/A', 'N/A', 'short_logged', 'short URL recorded only'): n for url, n in counts.items()}),
+            ('from_text', 'from_type', 'to_text', 'to_type', 'status', 'note')))
 
 def replace_links(body, title, page_id):
-    def log_change(from_link, to_link, from_type, to_type, status, note):
-        link_map_records.append({
-            'page_id': page_id,
-            'page_title': title,
-            'from_text': from_link,
-            'from_type': from_type,
-            'to_text': to_link if to_link else 'N/A',
-            'to_type': to_type if to_link else 'N/A',
-            'status': status,
-            'note': note
-        })
-
-    original = body
-    changed = False
-
-    # 일반 display, spaces 링크 교체
-    for space in ORIGIN_SPACES:
-        patterns = [
-            (rf'/display/{space}/', f'/display/{TARGET_SPACE}/', 'display'),
-            (rf'/spaces/{space}/pages/', f'/spaces/{TARGET_SPACE}/pages/', 'spaces'),
-            (rf'https://[^"]+/wiki/display/{space}/', f'/display/{TARGET_SPACE}/', 'abs_display'),
-            (rf'https://[^"]+/wiki/spaces/{space}/pages/', f'/spaces/{TARGET_SPACE}/pages/', 'abs_spaces'),
-        ]
-        for pattern, replacement, ptype in patterns:
-            matches = re.findall(pattern, body)
-            for match in matches:
-                before = match
-                after = replacement
-                body = body.replace(before, after)
-                changed = True
-                log_change(before, after, ptype, 'relative', 'converted', f'{space} → {TARGET_SPACE}')
-
-    # draw.io 링크 속성
-    matches = re.findall(r'link="([^"]+)"', body)
-    for match in matches:
-        replaced = match
-        for space in ORIGIN_SPACES:
-            if f'/spaces/{space}/pages/' in match:
-                replaced = match.replace(f'/spaces/{space}/', f'/spaces/{TARGET_SPACE}/')
-                changed = True
-                body = body.replace(match, replaced)
-                log_change(match, replaced, 'drawio', 'relative', 'converted', f'{space} → {TARGET_SPACE}')
-
-    if not changed:
-        log_change('N/A', 'N/A', 'none', 'none', 'unchanged', 'No link replaced')
+    """
+    display / spaces 링크를 한 번의 패스로 치환하면서 (from, to, type) 별 횟수를 모아 페이지 단위로 로그 기록
+    """
+    counts = Counter()
+
+    def repl(m):
+        if m.group('display'):
+            space, ptype, after = m.group('display'), 'display', f'/display/{TARGET_SPACE}/'
+        else:
+            space, ptype, after = m.group('spaces'), 'spaces', f'/spaces/{TARGET_SPACE}/pages/'
+        counts[(m.group(0), ptype, after, 'relative', 'converted', f'{space} → {TARGET_SPACE}')] += 1
+        return after
+
+    body = LINK_PATTERN.sub(repl, body)
+
+    if not counts:
+        counts[('N/A', 'none', 'N/A', 'none', 'unchanged', 'No link replaced')] += 1
+
+    if link_map_log:
+        link_map_log.write_rows(counted_rows(
+            {'page_id': page_id, 'page_title': title}, counts,
+            ('from_text', 'from_type', 'to_text', 'to_type', 'status', 'note')))
 
     return body
 
 def update_page(pid, title):
     url = f"{BASE_URL}/rest/api/content/{pid}?expand=body.storage,version"
-    res = requests.get(url, auth=auth)
+    res = client.get(url)
     if res.status_code != 200:
         print(f"❌ Failed to get {title}")
         return
@@ -142,33 +125,21 @@ def update_page(pid, title):
     }
 
     put_url = f"{BASE_URL}/rest/api/content/{pid}"
-    put_res = requests.put(put_url, json=payload, auth=auth, headers=headers)
+    put_res = client.put(put_url, json=payload)
     print(f"{'✅ Updated' if put_res.status_code == 200 else '❌ Failed'}: {title}")
 
 if __name__ == "__main__":
     ROOT_PAGE_ID = '123456789'
-    pages = get_child_pages(ROOT_PAGE_ID)
-    print(f"🔍 Pages under root {ROOT_PAGE_ID}: {len(pages)}")
-
-    for pid, title in pages:
-        update_page(pid, title)
-        time.sleep(0.5)
-
-    with open('short_urls.csv', 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(['title', 'page_id', 'short_url'])
-        writer.writerows(short_url_records)
-
-    with open('link_map.csv', 'w', newline='', encoding='utf-8') as f:
-        fieldnames = [
-            'page_id', 'page_title',
-            'from_text', 'from_type',
-            'to_text', 'to_type',
-            'status', 'note'
-        ]
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(link_map_records)
-
-    print(f"\n📄 link_map.csv 기록 완료 ({len(link_map_records)} entries)")
-    print(f"⚠️ short_urls.csv 기록 완료 ({len(short_url_records)} entries)")
+    link_map_log = StreamingCsvLog(LINK_MAP_PATH, LINK_MAP_FIELDS)
+    short_url_log = StreamingCsvLog(SHORT_URL_PATH, SHORT_URL_FIELDS)
+    try:
+        pages = get_child_pages(ROOT_PAGE_ID)
+        print(f"🔍 Pages under root {ROOT_PAGE_ID}: {len(pages)}")
+
+        run_pages(pages, update_page, workers=WORKERS)
+    finally:
+        link_map_log.close()
+        short_url_log.close()
+
+    print(f"\n📄 {LINK_MAP_PATH} 기록 완료 ({link_map_log.rows} entries)")
+    print(f"⚠️ {SHORT_URL_PATH} 기록 완료 ({short_url_log.rows} entries)")
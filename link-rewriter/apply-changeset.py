@@ -0,0 +1,35 @@
+# plan 모드(PLAN_DIR 지정)로 만든 changeset 을 적용
+#
+#   PLAN_DIR=plan python link-rewriter.py      # 1) 계산만: 본문/첨부 변경을 plan/ 에 기록
+#   PLAN_DIR=plan python apply-changeset.py    # 2) 쓰기 시간대에 적용 (WORKERS 개 writer, 초당 RATE 요청)
+#
+# 중단 후 다시 실행하면 plan/applied.jsonl 에 있는 변경은 건너뜀
+# plan 을 만든 서버(changes.jsonl 헤더의 base_url)와 BASE_URL 이 다르면 적용하지 않음
+
+import os, sys
+from dotenv import load_dotenv
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 루트의 공용 모듈 import 용
+from confluence_client import ConfluenceClient
+from changeset import apply_changeset
+
+load_dotenv()
+
+API_TOKEN = os.getenv("API_TOKEN")
+BASE_URL = os.getenv("BASE_URL")
+PLAN_DIR = os.getenv("PLAN_DIR") or "plan"
+WORKERS = int(os.getenv("WORKERS") or 4)   # 동시에 쓰는 writer 수
+RATE = float(os.getenv("RATE") or 5)       # 초당 최대 요청 수 (0 이면 제한 없음)
+
+headers = {
+    "Authorization": f"Bearer {API_TOKEN}",
+    "Content-Type": "application/json",
+}
+client = ConfluenceClient(BASE_URL, headers=headers, pool_size=max(10, WORKERS * 2))
+
+if __name__ == "__main__":
+    try:
+        counts = apply_changeset(client, PLAN_DIR, workers=WORKERS, rate=RATE)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"\n✅ Changeset {PLAN_DIR} applied: " + ", ".join(f"{k}={v}" for k, v in sorted(counts.items())))
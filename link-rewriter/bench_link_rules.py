@@ -0,0 +1,84 @@
+# 링크 치환 벤치마크: 기존 정규식 체인 vs link_rules 단일 패스 엔진
+#
+#   python bench_link_rules.py            # 기본 크기
+#   python bench_link_rules.py 5000 20000 # 링크 개수 지정
+#
+# 네트워크 조회(get_page_space_title / get_page_info_by_title / get_new_short_url)는 오프라인 dict 로 대체.
+# link-rewriter.py 는 import 만 하고 open_stores() 는 부르지 않으므로 캐시/상태 파일을 만들지 않음.
+# 두 방식의 결과가 같은지 먼저 확인한 뒤 시간을 잰다.
+
+import contextlib, importlib.util, io, os, random, sys, time
+
+os.environ.setdefault("BASE_URL", "https://wiki.example.com/confluence")
+
+spec = importlib.util.spec_from_file_location(
+    "link_rewriter", os.path.join(os.path.dirname(os.path.abspath(__file__)), "link-rewriter.py"))
+lr = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(lr)
+
+BASE = lr.BASE_URL
+ORIGIN = lr.ORIGIN_SPACES
+TARGET = lr.TARGET_SPACE
+
+# 오프라인 매핑: origin page id 1000000+i → target page id 2000000+i, tiny code Ai → Bi
+lr.get_page_space_title = lambda pid: (ORIGIN[int(pid) % len(ORIGIN)], f"T{pid}") if int(pid) < 2000000 else (TARGET, f"T{pid}")
+lr.get_page_info_by_title = lambda space, title: {"id": str(int(title[1:]) + 1000000)}
+lr.get_new_short_url = lambda short_url, space: short_url.replace("/x/A", "/x/B")
+
+
+def make_body(n_links, quoted=True, seed=0):
+    rnd = random.Random(seed)
+    parts = []
+    for i in range(n_links):
+        space = rnd.choice(ORIGIN + ["OTHER"])
+        kind = rnd.randrange(5)
+        if kind == 0:
+            url = f"{BASE}/display/{space}/Page+{i}"
+        elif kind == 1:
+            url = f"/display/{space}/Page+{i}"
+        elif kind == 2:
+            url = f"{BASE}/spaces/{space}/pages/{i}/Page"
+        elif kind == 3:
+            url = f"{BASE}/pages/viewpage.action?pageId={1000000 + rnd.randrange(500)}"
+        else:
+            url = f"{BASE}/x/A{rnd.randrange(500):05d}"
+        if quoted:
+            parts.append(f'<p>text {i} <a href="{url}">link</a></p>')
+        else:
+            parts.append(f"text {i} {url} ")  # 코드 블록 등 따옴표 없는 긴 텍스트
+    return "".join(parts)
+
+
+def legacy(body):
+    body = lr.replace_links_spacekey(body)
+    body = lr.replace_links_tinyui(body, "0")
+    body = lr.replace_links_page_id(body, base_url=BASE)
+    return body
+
+
+def timed(fn, body, repeat=3):
+    best = None
+    for _ in range(repeat):
+        lr.short_urls.clear()
+        lr.pageid_urls.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            t = time.perf_counter()
+            out = fn(body)
+            dt = time.perf_counter() - t
+        best = dt if best is None else min(best, dt)
+    return out, best
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [1000, 5000, 20000]
+    print(f"{'body':>8} {'links':>7} {'size':>9} {'legacy(s)':>10} {'rules(s)':>9} {'speedup':>8}")
+    for quoted in (True, False):
+        for n in sizes:
+            if not quoted and n > 5000:
+                continue  # 따옴표 없는 본문은 기존 체인의 https://[^"]+ 역추적으로 급격히 느려짐
+            body = make_body(n, quoted)
+            old, t_old = timed(legacy, body)
+            new, t_new = timed(lr.replace_links, body)
+            assert old == new, "결과 불일치"
+            print(f"{'attr' if quoted else 'text':>8} {n:>7} {len(body) / 1e6:>7.2f}MB "
+                  f"{t_old:>10.3f} {t_new:>9.3f} {t_old / t_new:>7.1f}x")
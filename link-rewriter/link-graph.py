@@ -0,0 +1,37 @@
+# link-rewriter.py 가 처리하며 쌓은 링크 그래프(LINK_GRAPH_PATH) 조회
+#
+#   python link-graph.py space TR          # TR 공간으로 들어오는 링크가 있는 페이지
+#   python link-graph.py page 123          # 페이지 123 으로 들어오는 링크가 있는 페이지
+#   python link-graph.py page 123 TR 제목  # + 제목 링크(/display/TR/제목, ri:page)
+#   python link-graph.py out 123           # 페이지 123 이 가진 링크
+
+import os, sys
+from dotenv import load_dotenv
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 루트의 공용 모듈 import 용
+from link_graph import LinkGraph, DEFAULT_PATH
+
+load_dotenv()
+
+BASE_URL = os.getenv("BASE_URL")
+LINK_GRAPH_PATH = os.getenv("LINK_GRAPH_PATH") or DEFAULT_PATH
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("space", "page", "out"):
+        print("usage: python link-graph.py space KEY | page ID [SPACE TITLE] | out ID")
+        sys.exit(1)
+    graph = LinkGraph(LINK_GRAPH_PATH)
+    cmd, arg = sys.argv[1], sys.argv[2]
+    if cmd == "out":
+        for link in graph.outbound(BASE_URL, arg):
+            print(f"{link['origin']}\t{link['kind']}\t{link['target']}\t"
+                  f"{link['target_space'] or ''}\t{link['target_id'] or ''}\tx{link['count']}")
+    else:
+        if cmd == "space":
+            pages = graph.pages_linking_to_space(BASE_URL, arg)
+        else:
+            space, title = (sys.argv[3], sys.argv[4]) if len(sys.argv) >= 5 else (None, None)
+            pages = graph.pages_linking_to_page(BASE_URL, arg, space, title)
+        for pid, title in pages:
+            print(f"{pid}\t{title or ''}")
+        print(f"🔍 {len(pages)} pages link to {cmd} {arg}")
+    graph.close()
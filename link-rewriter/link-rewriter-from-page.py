@@ -1,7 +1,11 @@
 
 # 일반 링크 변경 + 짧은 URL 수집
 
-import requests, re, csv, time
+import re, csv, os, sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 루트의 공용 모듈 import 용
+from confluence_client import ConfluenceClient
+from space_crawler import iter_space_pages
+from page_runner import run_pages
 
 # 설정
 USERNAME = 'your.email@example.com'
@@ -11,21 +15,14 @@ ORIGIN_SPACES = ['SPACE_A1', 'SPACE_A2', 'SPACE_A3']
 TARGET_SPACE = 'SPACE_B'
 auth = (USERNAME, API_TOKEN)
 headers = {'Content-Type': 'application/json'}
+WORKERS = 1  # 동시에 처리할 페이지 수 (1 이면 순차 처리)
+client = ConfluenceClient(BASE_URL, headers=headers, auth=auth, pool_size=max(10, WORKERS * 2))  # keep-alive 풀 + 재시도 + timeout
 
 short_url_records = []
 
 def get_all_page_ids(space_key):
-    ids = []
-    start = 0
-    while True:
-        url = f"{BASE_URL}/rest/api/content?spaceKey={space_key}&limit=50&start={start}&expand=version"
-        res = requests.get(url, auth=auth)
-        results = res.json().get("results", [])
-        if not results: break
-        for page in results:
-            ids.append((page['id'], page['title']))
-        start += 50
-    return ids
+    # 최대 page size + _links.next 로 공간 전체 목록 (space_crawler)
+    return [(page['id'], page['title']) for page in iter_space_pages(client, [space_key], expand="version")]
 def get_child_pages(parent_id):
     """지정한 페이지 ID 이하의 모든 하위 페이지 ID+제목 리스트 반환"""
     pages = []
@@ -34,7 +31,7 @@ def get_child_pages(parent_id):
     while stack:
         current_id = stack.pop()
         url = f"{BASE_URL}/rest/api/content/{current_id}?expand=children.page"
-        res = requests.get(url, auth=auth)
+        res = client.get(url)
         if res.status_code != 200:
             print(f"❌ Failed to get children of {current_id}")
             continue
@@ -66,7 +63,7 @@ def detect_short_urls(body, title, page_id):
 
 def update_page(pid, title):
     url = f"{BASE_URL}/rest/api/content/{pid}?expand=body.storage,version"
-    res = requests.get(url, auth=auth)
+    res = client.get(url)
     if res.status_code != 200:
         print(f"❌ Failed to get {title}")
         return
@@ -91,7 +88,7 @@ def update_page(pid, title):
     }
 
     put_url = f"{BASE_URL}/rest/api/content/{pid}"
-    put_res = requests.put(put_url, json=payload, auth=auth, headers=headers)
+    put_res = client.put(put_url, json=payload)
     print(f"{'✅ Updated' if put_res.status_code == 200 else '❌ Failed'}: {title}")
 
 if __name__ == "__main__":
@@ -99,9 +96,7 @@ if __name__ == "__main__":
     pages = get_child_pages(ROOT_PAGE_ID)
     print(f"🔍 Pages under root {ROOT_PAGE_ID}: {len(pages)}")
 
-    for pid, title in pages:
-        update_page(pid, title)
-        time.sleep(0.5)
+    run_pages(pages, update_page, workers=WORKERS)
 
     with open('short_urls.csv', 'w', newline='', encoding='utf-8') as f:
         writer = csv.writer(f)
@@ -5,8 +5,28 @@ from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from typing import List, Tuple, Optional, Callable, Dict, Any
 from urllib.parse import urljoin, urlparse, parse_qs, unquote_plus
-#from drawio_utils import replace_links_drawio
-import os
+import os, sys, threading
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 루트의 공용 모듈(drawio_utils 등) import 용
+from drawio_utils import (format_drawio_summary, iter_drawio_attachments, process_drawio_attachments,
+                          scan_drawio_attachment, candidate_filter, rewrite_memo, set_tiny_offline, set_cpu_pool,
+                          attachment_name)
+from confluence_client import ConfluenceClient
+from title_index import build_title_index, lookup_title
+from resolution_cache import ResolutionCache, DEFAULT_PATH as DEFAULT_CACHE_PATH
+from pipeline import run_pipeline
+from page_crawler import iter_page_tree
+from page_selector import select_pages
+from space_crawler import iter_space_pages, BODY_EXPAND as SPACE_BODY_EXPAND
+from link_rules import get_link_rules
+from single_flight import SingleFlight
+from page_prefetch import collect_page_ids, prefetch_pages
+from page_state import PageState, ruleset_hash, attachments_hash, DEFAULT_PATH as DEFAULT_STATE_PATH
+from run_journal import RunJournal, replay, DEFAULT_PATH as DEFAULT_JOURNAL_PATH
+from changeset import ChangesetWriter
+from link_graph import LinkGraph, DEFAULT_PATH as DEFAULT_GRAPH_PATH
+from tiny_code import codec_matches, tiny_page_id, tiny_path
+from cpu_pool import CpuPool, rewrite_body, set_mappings
 # 설정
 #설정 - 검증서버
 load_dotenv()
@@ -29,6 +49,17 @@ TARGET_SPACE = 'ARU'
 
 TESTPAGE = 'TESTPAGE'
 
+WORKERS = int(os.getenv("WORKERS") or 1)  # 동시에 처리할 페이지 수 (1 이면 기존처럼 순차 처리)
+INCREMENTAL = os.getenv("FULL_RUN") != "1"  # 지난 실행 이후 버전이 바뀐 페이지만 처리 (FULL_RUN=1 이면 전체)
+DRAWIO_WORKERS = int(os.getenv("DRAWIO_WORKERS") or 4)  # 한 페이지 안에서 동시에 처리할 draw.io 첨부 수
+DRAWIO_SERVER_FILTER = os.getenv("DRAWIO_SERVER_FILTER") == "1"  # 첨부 목록을 서버에서 mediaType 으로 걸러 받기
+CQL_SELECT = os.getenv("CQL_SELECT") == "1"  # root 아래에서 CQL 텍스트 검색에 걸린 페이지만 처리 (검색을 못 믿으면 전체 crawl)
+JOURNAL_PATH = os.getenv("JOURNAL_PATH") or DEFAULT_JOURNAL_PATH  # 진행 저널 (--resume 으로 이어서 실행)
+CPU_WORKERS = int(os.getenv("CPU_WORKERS") or 0)  # 2단계 실행 apply 단계의 본문 치환을 프로세스 n 개에서 (0 이면 스레드에서)
+TINY_OFFLINE = os.getenv("TINY_OFFLINE") != "0"  # tiny /x/CODE 를 리다이렉트 없이 page id 로 디코딩 (제목 인덱스의 tinyui 와 맞을 때만)
+PLAN_DIR = os.getenv("PLAN_DIR")  # 지정하면 plan 모드: PUT/업로드 대신 changeset 기록 (적용은 apply-changeset.py)
+CHECK_ATTACHMENTS = os.getenv("CHECK_ATTACHMENTS") != "0"  # 증분 실행에서 버전이 같은 페이지도 draw.io 첨부 버전 비교 (페이지당 첨부 목록 요청 1회, 0 이면 페이지 버전만)
+
 auth = (EMAIL, API_TOKEN)
 headers = {
     "Authorization": f"Bearer {API_TOKEN}",  # Bearer 토큰 방식으로 인증
@@ -36,46 +67,135 @@ headers = {
 #    "Accept": "application/json"
 }
 
+# 모든 API 호출이 공유하는 클라이언트 (keep-alive 풀: crawl/fetch/rewrite/write 단계 × WORKERS)
+client = ConfluenceClient(BASE_URL, headers=headers, pool_size=max(10, WORKERS * 4))
+
 short_urls = {}
 pageid_urls = {}
-
-
+target_title_index = None  # TARGET_SPACE title → page info, build_target_title_index() 로 생성
+tiny_offline = False  # enable_tiny_offline() 로 확인 후 켬 (tiny 코드 로컬 디코딩)
+inflight = SingleFlight()  # 동시에 들어온 같은 조회(tiny/page id/title)는 HTTP 한 번으로 합침
+resolution_cache = None      # 실행 간 공유되는 해석 캐시 (open_stores() 로 염)
+page_state = None            # 페이지별 마지막 처리 버전, 증분 실행용 (open_stores())
+link_graph = None            # 처리하며 본 링크, 원본 페이지 → 대상 (open_stores())
+journal = None               # open_journal() 로 연 RunJournal (없으면 기록 안 함)
+completed_pages = set()      # 이번 실행(또는 --resume 으로 이어받은 실행)에서 끝난 page id
+uploaded_attachments = set() # 이번 실행에서 새 버전을 올린 (page id, attachment id)
+DONE_STATUSES = ("updated", "nochange", "planned")  # 저널의 페이지 상태 중 완료로 보는 것 (partial / failed 는 다시 처리)
+changeset = None             # plan 모드의 ChangesetWriter (open_changeset() 로 생성)
+cpu_pool = None              # 2단계 실행 apply 단계의 CpuPool (open_cpu_pool() 로 생성)
+
+
+
+def open_stores():
+    """
+    SQLite 저장소(해석 캐시 / 페이지 상태 / 링크 그래프)를 연다. 실행 시작 시 한 번 호출
+    (모듈을 import 만 해서는 현재 디렉터리에 파일이 생기지 않도록 - bench_link_rules.py 등)
+    """
+    global resolution_cache, page_state, link_graph
+    resolution_cache = ResolutionCache(os.getenv("CACHE_PATH") or DEFAULT_CACHE_PATH)
+    page_state = PageState(os.getenv("STATE_PATH") or DEFAULT_STATE_PATH)
+    link_graph = LinkGraph(os.getenv("LINK_GRAPH_PATH") or DEFAULT_GRAPH_PATH)
 
 def get_all_page_ids(space_key):
-    ids = []
-    start = 0
-    while True:
-        url = f"{BASE_URL}/rest/api/content?spaceKey={space_key}&limit=50&start={start}&expand=version"
-        res = requests.get(url, headers=headers)
-        results = res.json().get("results", [])
-        if not results: break
-        for page in results:
-            ids.append((page['id'], page['title']))
-        start += 50
-    return ids
-def get_child_pages(parent_id):
-    """지정한 페이지 ID 이하의 모든 하위 페이지 ID+제목 리스트 반환"""
-    pages = []
-    stack = [parent_id]
-
-    while stack:
-        current_id = stack.pop()
-        url = f"{BASE_URL}/rest/api/content/{current_id}?expand=children.page"
-        #res = requests.get(url, auth=auth)
-        res = requests.get(url, headers=headers)
-        if res.status_code != 200:
-            print(f"❌ Failed to get children of {current_id}")
-            continue
+    return [(page['id'], page['title']) for page in iter_space(space_key) if not should_skip(page)]
 
-        data = res.json()
-        title = data.get("title", "Untitled")
-        pages.append((current_id, title))
+def iter_space(space_keys, expand_body=False):
+    """
+    공간(들) 전체 페이지 JSON 을 받는 즉시 yield (space_crawler.iter_space_pages)
+    최대 page size + _links.next 로 목록 요청 수 최소화, 공간 여러 개면 동시에 열거
+    expand_body=True 면 목록 요청에서 body.storage,version,space 까지 받아 fetch 단계의 본문 재조회 생략
+    """
+    if isinstance(space_keys, str):
+        space_keys = [space_keys]
+    expand = SPACE_BODY_EXPAND if expand_body else "version"
+    return iter_space_pages(client, space_keys, expand=expand, workers=WORKERS)
+def get_child_pages(parent_id):
+    """지정한 페이지 ID 이하의 하위 페이지 ID+제목 리스트 반환 (증분 실행이면 지난 실행 이후 바뀐 페이지만)"""
+    return [(data['id'], data.get("title", "Untitled")) for data in iter_target_pages(parent_id) if not should_skip(data)]
 
-        children = data.get("children", {}).get("page", {}).get("results", [])
-        for child in children:
-            stack.append(child["id"])
-    return pages
+def iter_target_pages(root_id, expand_body=False):
+    """
+    처리할 root 이하 페이지 JSON.
+    CQL_SELECT 면 ORIGIN_SPACES 링크 검색어로 CQL 검색한 페이지(+ root)만 (page_selector.select_pages, 본문은 fetch 단계에서),
+    아니거나 검색을 믿을 수 없으면(실패/색인 누락/샘플 본문의 치환 대상이 검색 결과에 없음) 트리 전체 crawl
+    """
+    if CQL_SELECT:
+        selected = select_pages(client, ORIGIN_SPACES, root_id=root_id,
+                                may_match=get_link_rules(BASE_URL, ORIGIN_SPACES, TARGET_SPACE).may_match)
+        if selected is not None:
+            print(f"🎯 CQL selected {len(selected)} pages under {root_id}")
+            return iter([client.get_content(root_id, "version")] + selected)
+        print(f"↩️ CQL selection not trusted, crawling all pages under {root_id}")
+    return iter_child_pages(root_id, expand_body)
+
+def iter_child_pages(parent_id, expand_body=False):
+    """
+    지정한 페이지 ID 이하의 페이지 JSON 을 발견 즉시 yield (전체 목록을 만들지 않음)
+    /child/page 페이지네이션 + 형제 하위 트리 병렬 탐색 (page_crawler.iter_page_tree)
+    expand_body=True 면 같은 요청에서 body.storage,version 도 받아 update 단계의 재조회를 생략
+    (False 여도 version 은 받음 → is_unchanged 로 본문 조회 전에 건너뛰기)
+    """
+    expand = "body.storage,version" if expand_body else "version"
+    return iter_page_tree(client, parent_id, expand=expand, workers=WORKERS)
   
+def current_ruleset_hash():
+    return ruleset_hash(BASE_URL, ORIGIN_SPACES, TARGET_SPACE)
+
+def is_unchanged(page):
+    """
+    목록 JSON(expand=version)의 버전이 지난 실행 기록과 같으면 True → 본문 조회 없이 건너뜀
+    (CHECK_ATTACHMENTS 면 버전이 같을 때 draw.io 첨부 목록을 받아 첨부 버전도 비교 — 첨부 새 버전은 페이지 버전을 올리지 않음.
+     첨부 목록 조회에 실패하면 바뀐 것으로 보고 처리 → 한 페이지 오류로 crawl 전체가 멈추지 않음)
+    """
+    if not INCREMENTAL:
+        return False
+    version = (page.get('version') or {}).get('number')
+    try:
+        return page_state.is_unchanged(BASE_URL, page['id'], version, current_ruleset_hash(),
+                                       current_attachments_hash(page['id']) if CHECK_ATTACHMENTS else None)
+    except Exception as e:
+        print(f"⚠️ Attachment check failed for {page.get('title') or page['id']}, processing it: {e}")
+        return False
+
+def current_attachments_hash(page_id):
+    """page_state.is_unchanged 에 넘길 현재 draw.io 첨부 해시 함수 (버전/규칙이 같을 때만 호출됨)"""
+    return lambda: attachments_hash(attachment_versions(_iter_drawio_attachments(page_id)))
+
+def should_skip(page):
+    """이번 실행에서 이미 끝낸 페이지(저널) 또는 지난 실행 이후 안 바뀐 페이지면 True"""
+    return page['id'] in completed_pages or is_unchanged(page)
+
+def open_journal(resume=False):
+    """
+    진행 저널을 연다. resume=True 면 기존 저널을 재생해 완료 페이지/업로드한 첨부/해석 결과를 복원하고 이어 씀
+    (BASE_URL/ORIGIN_SPACES/TARGET_SPACE 가 다르면 이어받지 않고 새로 시작)
+    """
+    global journal
+    rules = current_ruleset_hash()
+    if resume:
+        records = list(replay(JOURNAL_PATH))
+        starts = [r for r in records if r.get("t") == "start"]
+        if any(r.get("base_url") != BASE_URL or r.get("rules") != rules for r in starts):
+            print(f"⚠️ Journal {JOURNAL_PATH} was written with different settings, starting over")
+            resume, records = False, []
+        for r in records:
+            t = r.get("t")
+            if t == "page" and r.get("status") in DONE_STATUSES:
+                completed_pages.add(r["id"])
+            elif t == "attachment":
+                uploaded_attachments.add((r["page"], r["att"]))
+            elif t == "short_url":
+                short_urls[r["old"]] = r["new"]
+            elif t == "page_id":
+                pageid_urls[r["old"]] = r["new"]
+        if resume:
+            print(f"⏯️ Resuming from {JOURNAL_PATH}: {len(completed_pages)} pages done, "
+                  f"{len(short_urls)} short urls / {len(pageid_urls)} page ids restored")
+    journal = RunJournal(JOURNAL_PATH, resume=resume)
+    journal.start(BASE_URL, rules)
+    return journal
+
 def replace_links_spacekey(body, prefix=""):
     for space in ORIGIN_SPACES:
         #body = re.sub(rf'{BASE_URL}/display/{space}/', f'{BASE_URL}/display/{TARGET_SPACE}/', body)
@@ -94,15 +214,12 @@ def replace_links_tinyui(body, page_id, prefix=""):
     for m in matches:
         partial = "".join(m)
         short_url = f"{BASE_URL}{partial}" if partial.startswith('/x') or '/wiki/x' in partial else partial
-        if short_url not in short_urls:
-            new_url = get_new_short_url(short_url, TARGET_SPACE)
-            short_urls[short_url] = new_url
+        new_url = resolve_target_short_url(short_url)
+        if new_url is None:
+            continue
+        if short_url in body:
             body = re.sub(short_url, new_url, body)
             print(f"🔗 Replaced {short_url} with {new_url}")
-
-        # else:
-        #     print(f"❌ 이 short url은 수정되었어야 함 {short_url}")
-        #    continue
     
     return body
 
@@ -115,172 +232,148 @@ def replace_links_page_id(body, prefix="", base_url=BASE_URL):
     matches = re.findall(rf'{prefix+base_url}/pages/viewpage\.action\?pageId=\d+', body)
     for m in matches:
         page_id = extract_page_id(m)
-        if page_id in pageid_urls:
-            continue
-#        if page_id == pageid_urls[page_id] : continue #page_id 동일하면 space가 origin_space에 있던게 아니다. 즉, 변경할 필요가 없다.
-        page_info = get_page_info_by_id(page_id)
+        target_page_id = resolve_target_page_id(page_id)
+        if target_page_id:
+            old_url = m
+            new_url = f"{base_url}/pages/viewpage.action?pageId={target_page_id}"
+            body = body.replace(old_url, new_url)
+            print(f"🔗 Replaced {old_url} with {new_url}")
+
+    return body
+
+def resolve_target_short_url(short_url):
+    """
+    short url → TARGET_SPACE 의 같은 제목 페이지 short url (없으면 None)
+    이미 해석한 short url 도 매번 적용해야 함 (병렬 실행 시 처리 순서와 무관하게 동일 결과)
+    """
+    if short_url not in short_urls:
+        short_urls[short_url] = get_new_short_url(short_url, TARGET_SPACE)
+        if journal:
+            journal.short_url(short_url, short_urls[short_url])
+    new_url = short_urls[short_url]
+    if new_url is None:
+        print(f"❌ Target not found for {short_url}")
+    return new_url
+
+def resolve_target_page_id(page_id):
+    """
+    ORIGIN_SPACES 페이지 id → TARGET_SPACE 의 같은 제목 페이지 id (바꿀 필요 없거나 못 찾으면 None)
+    """
+    if page_id not in pageid_urls:
+        page_info = get_page_space_title(page_id)
         if page_info is None:
             print(f"❌ Page not found: {page_id}")
-            continue
-        space = page_info['_expandable']['space'].strip('/').split('/')[-1] #space path의 맨마지막 가지고 옴
-        title = page_info['title']
+            return None
+        space, title = page_info
         if space in ORIGIN_SPACES:
-                target_page_info = get_page_info_by_title(TARGET_SPACE, title)
-                if target_page_info:
-                    target_page_id = target_page_info.get('id')
-                    old_url = m
-                    new_url = f"{base_url}/pages/viewpage.action?pageId={target_page_id}"
-                    body = body.replace(old_url, new_url)
-                    print(f"🔗 Replaced {old_url} with {new_url}")
-                    pageid_urls[page_id] = target_page_id
+            target_page_info = get_page_info_by_title(TARGET_SPACE, title)
+            if not target_page_info:
+                return None
+            pageid_urls[page_id] = target_page_info.get('id')
         else :
             pageid_urls[page_id] = page_id #page_id 동일하면 space가 origin_space에 있던게 아니다. 즉, 변경할 필요가 없다.
+        if journal:
+            journal.page_id(page_id, pageid_urls[page_id])
+    target_page_id = pageid_urls[page_id]
+    return target_page_id if target_page_id != page_id else None
 
-    return body
-
-def _list_attachments(page_id: str, limit: int = 500):
-    url = f"{BASE_URL}/rest/api/content/{page_id}/child/attachment?limit={limit}&expand=metadata.labels,metadata.mediaType"
-    res = requests.get(url, headers=headers)
-    res.raise_for_status()
-    return res.json().get("results", [])
-
-def _download_attachment_via_link(att: Dict[str, Any]):
+def prefetch_page_ids(text):
     """
-    첨부 객체의 _links.download 를 사용해 안전하게 다운로드.
-    base_url 은 컨텍스트(/confluence, /wiki 포함)까지 들어간 값을 넘기세요.
+    text 의 pageId=N 중 아직 해석하지 않은 id 를 CQL 'id in (...)' 로 묶어 조회해 캐시에 미리 채움
+    (이후 resolve_target_page_id → get_page_space_title 은 캐시에서 응답)
     """
-    links = att.get("_links", {}) or {}
-    dl_path = links.get("download")  # 예: "/download/attachments/12345/diagram?version=2&api=v2"
-    if not dl_path:
-        raise RuntimeError(f"No download link in attachment: {att.get('id')}")
+    ids = [pid for pid in collect_page_ids(text) if pid not in pageid_urls]
+    if ids:
+        prefetch_pages(client, resolution_cache, ids)
 
-    url = urljoin(BASE_URL if BASE_URL.endswith("/") else BASE_URL + "/", dl_path.lstrip("/"))
-    res = requests.get(url, headers=headers, allow_redirects=True)
-    
-    if res.status_code == 404:
-        # 일부 인스턴스는 컨텍스트 경로 이슈로 루트(host) 기준이 필요한 경우가 있음
-        from urllib.parse import urlparse
-        p = urlparse(BASE_URL)
-        host_root = f"{p.scheme}://{p.netloc}"
-        url2 = urljoin(host_root + "/", dl_path.lstrip("/"))
-        res = requests.get(url2, headers=headers, allow_redirects=True)
-        
-
-    res.raise_for_status()
-    return res.content, res.headers.get("Content-Type", "")
-
-# ========= draw.io 파일 처리 =========
-def _looks_like_mxfile(data: bytes) -> bool:
-    # 간단 휴리스틱: <mxfile …> 헤더 확인
-    head = data[:2048].decode("utf-8", errors="ignore")
-    return "<mxfile" in head
-
-def _rewrite_single_url(old_url: str) -> Optional[str]:
-    """
-    old_url → (ORIGIN_SPACES → TARGET_SPACE 동일 제목) 새 URL.
-    매핑 실패 시 None.
-    """
-    # try:
-    #     u = _normalize_url(old_url, base_url)
-    #     pid = _extract_pageid_from_url(u, session, base_url)
-    #     if pid:
-    #         new_u = _build_target_url_by_pageid(session, base_url, origin_spaces, target_space, pid)
-    #         if new_u:
-    #             return new_u
-
-    #     # pageId 미검출: /display/ORG/TITLE 직접 매핑
-    #     p = urlparse(u)
-    #     m = re.search(r"/display/([^/]+)/(.+)$", p.path or "")
-    #     if m and m.group(1) in origin_spaces:
-    #         title = _decode_title_slug(m.group(2))
-    #         tgt = _build_target_url_by_title(session, base_url, target_space, title)
-    #         if tgt:
-    #             return tgt
-
-    #     return None
-    # except Exception:
-    #     return None
-
-def _upload_new_attachment_version( page_id: str,
-                                   attachment_id: str, filename: str, data: bytes, content_type: str):
-    url = f"{BASE_URL}/rest/api/content/{page_id}/child/attachment/{attachment_id}/data"
-    files = {'file': (filename or "diagram.drawio", data, content_type or 'application/octet-stream')}
-    
-    r = requests.post(url, headers=headers, files=files)
-    #r = session.post(url, files=files)
-    r.raise_for_status()
-    return r.json()
-
-        
-def _process_drawio_file(page_id: str,
-                         att_id: str, filename: str, data: bytes, rewrite_cb: Callable[[str], Optional[str]]) -> str:
+def replace_links(body, prefix=""):
     """
-    .drawio(xml): <mxfile><diagram>payload</diagram></mxfile>
-    payload이 압축이면 해제 → 치환 → 원형(압축/평문) 복원 후 업로드.
+    replace_links_spacekey → replace_links_tinyui → replace_links_page_id 를 컴파일된 규칙으로 한 번에 처리
     """
-    prefix = '"link="'
-
-    body = data.decode("utf-8", errors="replace")
-    org_body = body
-    print(f"xml {body}")
-
-    body = replace_links_spacekey(body, prefix)
-    body = replace_links_tinyui(body, prefix, page_id)
-    body = replace_links_page_id(body, prefix)
-    body = replace_links_short_page_id(body, prefix)
-
-    if(org_body != body):
-        print(f"drawio file updated: {filename}")
-        _upload_new_attachment_version(page_id, att_id, filename, body.encode("utf-8"), "application/xml")
-        
-    return body
+    rules = get_link_rules(BASE_URL, ORIGIN_SPACES, TARGET_SPACE, prefix)
+    return rules.rewrite(body, resolve_target_page_id, resolve_target_short_url, log_replaced_link)
 
+def replace_links_in_pool(body, prefix=""):
+    """
+    replace_links 와 같은 치환을 cpu_pool 프로세스에서 실행 (매핑이 다 채워진 2단계 실행의 apply 단계 전용,
+    매핑에 없는 page id / short url 은 조회하지 않고 그대로 둠). 치환 대상 키워드가 없으면 보내지 않음.
+    """
+    if not get_link_rules(BASE_URL, ORIGIN_SPACES, TARGET_SPACE, prefix).may_match(body):
+        return body
+    new_body, replaced = cpu_pool.run(rewrite_body, BASE_URL, ORIGIN_SPACES, TARGET_SPACE, prefix, body)
+    for kind, old_url, new_url in replaced:
+        log_replaced_link(kind, old_url, new_url)
+    return new_body
+
+def log_replaced_link(kind, old_url, new_url):
+    if kind in ("viewpage", "tiny"):
+        print(f"🔗 Replaced {old_url} with {new_url}")
+
+def _iter_drawio_attachments(page_id: str):
+    """draw.io 후보 첨부만 페이지네이션하며 yield (DRAWIO_SERVER_FILTER=1 이면 서버에서 mediaType 필터)"""
+    return iter_drawio_attachments(client, page_id, server_filter=DRAWIO_SERVER_FILTER)
+
+def attachment_versions(attachments):
+    """draw.io 후보 첨부 {id: 버전} (page_state 의 첨부 해시용)"""
+    return {att["id"]: (att.get("version") or {}).get("number") for att in attachments}
+
+def _upload_drawio_attachment(page_id, att, filename, data, content_type):
+    """process_drawio_attachments 의 upload: plan 모드면 changeset 에 기록, 아니면 새 버전 업로드 + 저널 기록"""
+    if changeset:
+        changeset.add_attachment(page_id, att["id"], filename, data, content_type,
+                                 (att.get("version") or {}).get("number"))
+    else:
+        client.upload_attachment(page_id, att["id"], filename, data, content_type)
+    uploaded_attachments.add((page_id, att["id"]))
+    if journal:
+        journal.attachment_uploaded(page_id, att["id"], filename)
 
-def replace_links_drawio(body, page_json:Dict[str, Any]): 
+def replace_links_drawio(body, page_json:Dict[str, Any], attachments=None, versions=None):
+    """
+    페이지의 draw.io 후보 첨부를 drawio_utils.process_drawio_attachments 로 DRAWIO_WORKERS 개씩 동시에 처리
+    (다이어그램 단위 스트리밍 치환, 압축 payload 해제/재압축) 하고 결과는 페이지당 한 번 요약 출력.
+    처리한 첨부의 링크는 링크 그래프에 origin "drawio:{첨부 id}" 로 기록 (후보 URL 이 있는 다이어그램 기준)
+    attachments 를 주면 첨부 목록을 조회하지 않고 그 첨부만 처리 (2단계 실행: scan 에서 후보 URL 이 있던 첨부,
+    versions 는 scan 때 본 전체 후보 첨부의 attachment_versions)
+    반환: (body, 처리 후 draw.io 첨부 {id: 버전}, 실패한 첨부가 있는지)
+          — 실패했거나 plan 모드로 기록한 첨부가 있으면 버전 대신 None
+    """
     page_id = page_json.get("id")
     if not page_id:
-        return body
-
-    # 1) 첨부 조회 (라벨/미디어타입 함께)
-    atts = _list_attachments(page_id)
-
-    # 2) draw.io 후보만 처리
-    for att in atts:
-        filename = att.get("title") or (att.get("metadata", {}) or {}).get("filename") or ""
-        labels = {lab["name"] for lab in (att.get("metadata", {}) or {}).get("labels", {}).get("results", [])}
-        media  = (att.get("metadata", {}) or {}).get("mediaType", "") or ""
-        low    = filename.lower()
-
-        is_drawio_label     = "drawio" in labels
-        is_drawio_mediatype = media in {"application/drawio", "application/vnd.jgraph.mxfile"}
-        is_svg              = (media == "image/svg+xml") or low.endswith(".svg")
-
-        if not (is_drawio_label or is_drawio_mediatype or is_svg or low.endswith(".drawio") or low.endswith(".drawio.svg")):
-            continue
-
-        try:
-            data, ctype = _download_attachment_via_link(att)
-
-            # .drawio (mxfile) 스타일
-            if is_drawio_mediatype or low.endswith(".drawio") or _looks_like_mxfile(data):
-                status = _process_drawio_file(
-                    page_id, att["id"], filename, data, lambda url: _rewrite_single_url(url)
-                )
-            # .svg 스타일
-            # elif is_svg or low.endswith(".drawio.svg"):
-            #     status = _process_drawio_svg(
-            #         session, BASE_URL, page_id, att["id"], filename, data,
-            #         lambda url: _rewrite_single_url(url, session, BASE_URL, ORIGIN_SPACES, TARGET_SPACE)
-            #     )
-            # else:
-            #     status = "skip"
-
-            print(f" - draw.io attachment {filename or att.get('id')}: {status}")
-
-        except Exception as e:
-            print(f" - draw.io attachment {filename or att.get('id')}: error: {e}")
-
-    return body
+        return body, {}, False
+
+    # 1) 첨부 조회 (라벨/미디어타입 함께) → draw.io 후보만
+    #    (중단 전 실행에서 이미 새 버전을 올린 첨부는 제외)
+    if attachments is None:
+        attachments = list(_iter_drawio_attachments(page_id))
+        versions = attachment_versions(attachments)
+    candidates = [att for att in attachments if (page_id, att["id"]) not in uploaded_attachments]
+    if not candidates:
+        return body, versions, False
+
+    texts = {att["id"]: [] for att in candidates}  # 첨부 id → 서버에 있는 내용 기준 다이어그램 평문
+    def text_cb(att, old, new):
+        texts[att["id"]].append(old if changeset else new)
+
+    # 2) 첨부별 처리
+    statuses = process_drawio_attachments(client, page_id, ORIGIN_SPACES, TARGET_SPACE,
+                                          target_title_index, resolution_cache, DRAWIO_WORKERS,
+                                          attachments=candidates, upload=_upload_drawio_attachment, text_cb=text_cb)
+    if changeset:
+        statuses = {name: ("planned" if status == "updated" else status) for name, status in statuses.items()}
+    for att in candidates:
+        if statuses.get(attachment_name(att)) in ("updated", "planned", "nochange", "skip"):
+            record_links(page_id, "\n".join(texts[att["id"]]), f"drawio:{att['id']}")
+    print(format_drawio_summary(page_json.get("title") or page_id, statuses, rewrite_memo.format_stats()))
+
+    failed = any(status not in ("updated", "nochange", "skip", "planned") for status in statuses.values())
+    if versions is None or failed or "planned" in statuses.values():
+        return body, None, failed
+    versions = dict(versions)
+    for att in candidates:
+        if statuses.get(attachment_name(att)) == "updated" and versions.get(att["id"]) is not None:
+            versions[att["id"]] += 1  # 방금 올린 새 버전
+    return body, versions, False
 
 
 def resolve_short_url_to_title(short_url):
@@ -289,17 +382,34 @@ def resolve_short_url_to_title(short_url):
     :param short_url: e.g. https://your-domain.atlassian.net/x/AbCdE
     :param auth: requests basic auth tuple (username, API token)
     """
-    response = requests.get(short_url, headers=headers, allow_redirects=True)
-    
+    return inflight.do(("tiny", BASE_URL, short_url), lambda: _resolve_short_url_to_title(short_url))
+
+def _resolve_short_url_to_title(short_url):
+    hit, cached = resolution_cache.get_tiny(BASE_URL, short_url)
+    if hit:
+        return cached["title"] if cached else None
+
+    # 로컬 디코딩한 page id 로 제목 조회 (캐시/묶음 조회 결과 재사용), 페이지가 없으면 아래 리다이렉트로 확인
+    page_id = tiny_page_id(short_url) if tiny_offline else None
+    page_info = get_page_space_title(page_id) if page_id else None
+    if page_info:
+        return page_info[1]
+
+    final_url = client.resolve_tiny(short_url)
+    if final_url is None:
+        resolution_cache.put_tiny(BASE_URL, short_url, None, None)
+        return None
+
     # 최종 리디렉션 URL에서 page ID 추출
-    title = response.url.split('/')[-1].replace('+', ' ') # url에서는 스페이스가 +로 나와서.
+    title = final_url.split('/')[-1].replace('+', ' ') # url에서는 스페이스가 +로 나와서.
+    resolution_cache.put_tiny(BASE_URL, short_url, final_url, title)
     return title
     
     return title
 
     
 def resolve_tiny_url(short_url):
-    response = requests.get(short_url, allow_redirects=False, headers=headers)
+    response = client.get(short_url, allow_redirects=False)
     if response.status_code in [301, 302]:
         return response.headers['Location']
     else:
@@ -319,10 +429,32 @@ def get_page_info_by_id(page_id):
     """
     url = f"{BASE_URL}/rest/api/content/{page_id}"
     params = {"expand": "title"}
-    response = requests.get(url, headers=headers, params=params)
+    response = client.get(url, params=params)
     response.raise_for_status()
     return response.json()
-    
+
+def get_page_space_title(page_id):
+    """
+    page ID → (space, title). 영구 캐시 우선, 404 는 None 으로 기록
+    캐시 확인 → 조회 → 기록 전체를 같은 page ID 단위로 한 번만 (먼저 온 호출이 끝난 직후 들어온 호출도 캐시에서 응답)
+    """
+    return inflight.do(("page", BASE_URL, page_id), lambda: _get_page_space_title(page_id))
+
+def _get_page_space_title(page_id):
+    hit, cached = resolution_cache.get_page(BASE_URL, page_id)
+    if hit:
+        return (cached['space'], cached['title']) if cached else None
+    try:
+        page_info = get_page_info_by_id(page_id)
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            resolution_cache.put_page(BASE_URL, page_id, None, None)
+            return None
+        raise
+    space = page_info['_expandable']['space'].strip('/').split('/')[-1] #space path의 맨마지막 가지고 옴
+    title = page_info['title']
+    resolution_cache.put_page(BASE_URL, page_id, space, title)
+    return space, title
 
 
 def get_short_url_by_title(title, space_key, base_url):
@@ -336,7 +468,7 @@ def get_short_url_by_title(title, space_key, base_url):
         "space": space_key,
         "expand": "version"  # title 존재 유무 확인용
     }
-    resp = requests.get(url, headers=headers, params=params)
+    resp = client.get(url, params=params)
     resp.raise_for_status()
     data = resp.json()
     
@@ -350,7 +482,7 @@ def get_short_url_by_title(title, space_key, base_url):
     
     # 3. 페이지 ID로 tiny link 정보 가져오기
     url = f"{base_url}/rest/api/content/{page_id}?expand=shortUrl,tinyui"
-    resp = requests.get(url, auth=auth)
+    resp = client.get(url)
     resp.raise_for_status()
     page_data = resp.json()
 
@@ -373,14 +505,53 @@ def url_encode_query(query_string):
     """
     return urllib.parse.quote_plus(query_string)
 
+def build_target_title_index():
+    """
+    TARGET_SPACE 전체를 한 번 훑어 제목 인덱스 생성 (set_variables 이후 호출)
+    """
+    global target_title_index
+    target_title_index = build_title_index(client, TARGET_SPACE)
+    print(f"📚 Title index built for {TARGET_SPACE}: {len(target_title_index)} pages")
+    enable_tiny_offline(target_title_index.values())
+    return target_title_index
+
+def enable_tiny_offline(pages):
+    """
+    pages(page info 의 id/tinyui)로 로컬 tiny 코드 변환이 이 서버와 맞는지 확인해 켬 (안 맞으면 리다이렉트 조회 유지)
+    """
+    global tiny_offline
+    tiny_offline = TINY_OFFLINE and codec_matches(pages)
+    set_tiny_offline(tiny_offline)  # draw.io 첨부 치환(drawio_utils)도 같은 설정
+    print(f"🔗 Tiny links: {'decoded locally' if tiny_offline else 'resolved by redirect'}")
+    return tiny_offline
+
 def get_page_info_by_title(space_key, title):
+    """
+    TARGET_SPACE 조회는 인덱스에서 응답, 인덱스에 없는 제목만 CQL 검색으로 fallback
+    """
+    if space_key == TARGET_SPACE and target_title_index is not None:
+        return lookup_title(target_title_index, title, lambda t: cached_page_info_by_title(space_key, t))
+    return cached_page_info_by_title(space_key, title)
+
+def cached_page_info_by_title(space_key, title):
+    return inflight.do(("title", BASE_URL, space_key, title), lambda: _cached_page_info_by_title(space_key, title))
+
+def _cached_page_info_by_title(space_key, title):
+    hit, cached = resolution_cache.get_target(BASE_URL, space_key, title)
+    if hit:
+        return cached
+    info = search_page_info_by_title(space_key, title)
+    resolution_cache.put_target(BASE_URL, space_key, title, info)
+    return info
+
+def search_page_info_by_title(space_key, title):
     url = f"{BASE_URL}/rest/api/search"
     params = {
         'cql': f'title="{title}" AND space="{space_key}"',
         'limit': 10
     }
     
-    response = requests.get(url, headers=headers, params=params)
+    response = client.get(url, params=params)
 
     if response.status_code != 200:
         raise Exception(f"Request failed with status code {response.status_code}")
@@ -405,7 +576,10 @@ def get_page_info_by_title(space_key, title):
 def get_new_short_url(short_url, new_space):
     # Step 1: Extract the page ID from the short URL
     title = resolve_short_url_to_title(short_url)
-    new_short_url = get_page_info_by_title(TARGET_SPACE, title)['tinyui']   
+    target_info = get_page_info_by_title(TARGET_SPACE, title) if title else None
+    new_short_url = target_info['tinyui'] if target_info else None
+    if target_info and not new_short_url and tiny_offline:
+        new_short_url = tiny_path(target_info['id'])
 
     if new_short_url:
         return f"{BASE_URL}{new_short_url}"
@@ -413,28 +587,121 @@ def get_new_short_url(short_url, new_space):
         return None
         
 
-def update_page(pid, title):
+def fetch_page(page):
+    """
+    [fetch 단계] body.storage,version 이 없으면 조회해서 채운 페이지 JSON 반환, 실패 시 None
+    """
+    if page.get('body', {}).get('storage') and page.get('version'):
+        return page
+    pid, title = page['id'], page.get('title')
     url = f"{BASE_URL}/rest/api/content/{pid}?expand=body.storage,version"
-    res = requests.get(url, headers=headers)
+    res = client.get(url)
     if res.status_code != 200:
         print(f"❌ Failed to get {title}")
-        return
+        return None
+    return res.json()
 
-    data = res.json()
+def rewrite_page(data, drawio_attachments=None, drawio_versions=None):
+    """
+    [rewrite 단계] 링크 치환. 변경이 있으면 (data, new_body, 처리 후 draw.io 첨부 버전, draw.io 실패 여부), 없으면 None
+    drawio_attachments / drawio_versions: 처리할 draw.io 첨부와 전체 후보 첨부 버전 (None 이면 첨부 목록 조회)
+    """
     body = data['body']['storage']['value']
-    version = data['version']['number']
-    
-    new_body = replace_links_spacekey(body)
-    new_body = replace_links_tinyui(new_body, pid)
-    new_body = replace_links_page_id(new_body)
-    new_body = replace_links_drawio(new_body, data)
+
+    if cpu_pool:
+        new_body = replace_links_in_pool(body)
+    else:
+        prefetch_page_ids(body)
+        new_body = replace_links(body)
+    new_body, drawio_versions, drawio_failed = replace_links_drawio(new_body, data, drawio_attachments, drawio_versions)
 
     if new_body == body:
-        print(f"🔍 No change: {title}")
+        finish_unchanged(data, drawio_versions, drawio_failed)
+        return None
+    return data, new_body, drawio_versions, drawio_failed
+
+def finish_unchanged(data, drawio_versions, drawio_failed=False):
+    """
+    본문을 바꿀 것이 없는 페이지: 링크 기록, 버전 기록(증분 실행), 완료 표시
+    drawio_versions 가 None 이면(draw.io 첨부 실패/plan 기록) 버전은 기록하지 않음 → 다음 실행에서 다시 처리
+    draw.io 첨부가 실패했으면 저널에 partial 로 남기고 완료로 치지 않음 (--resume 에서도 다시 처리)
+    """
+    body = data['body']['storage']['value']
+    record_links(data['id'], body, data=data)
+    if drawio_versions is not None:
+        page_state.record(BASE_URL, data['id'], data['version']['number'], body, current_ruleset_hash(),
+                          drawio_versions)
+    if drawio_failed:
+        print(f"⚠️ Partial (draw.io attachment failed): {data['title']}")
+        if journal:
+            journal.page_done(data['id'], "partial")
+        return
+    print(f"🔍 No change: {data['title']}")
+    completed_pages.add(data['id'])
+    if journal:
+        journal.page_done(data['id'], "nochange")
+
+def page_space(data):
+    if 'space' in data:  # 공간 열거(expand=...,space)로 받은 페이지
+        return data['space']['key']
+    return data['_expandable']['space'].strip('/').split('/')[-1] #space path의 맨마지막 가지고 옴
+
+def cached_space_title(page_id):
+    """해석 캐시에 있는 page id 의 (공간, 제목). 조회하지 않음"""
+    hit, cached = resolution_cache.get_page(BASE_URL, page_id)
+    return (cached['space'], cached['title']) if hit and cached else None
+
+def record_links(page_id, text, origin="body", data=None):
+    """
+    text 의 링크(모든 공간)를 링크 그래프에 기록, 같은 페이지/origin 의 이전 기록은 교체
+    pageId 링크의 대상 공간/제목은 해석 캐시에 있으면 채움, tiny 링크는 tiny_offline 일 때만 id 로 디코딩
+    """
+    link_graph.record_text(BASE_URL, page_id, text, origin,
+                           page_space(data) if data else None, data.get('title') if data else None,
+                           cached_space_title, tiny_offline)
+
+def pages_linking_to(space_keys):
+    """
+    링크 그래프에서 space_keys 로 들어오는 링크가 있는 페이지 [(id, title)] (지난 실행들에서 본 링크 기준, 트리 crawl 없음)
+    대상 공간을 모르는 pageid/tiny 링크는 먼저 묶음 조회로 채우고(fill_link_targets), 그래도 모르는 대상은 포함
+    """
+    fill_link_targets()
+    pages = {}
+    for space in space_keys:
+        for pid, title in link_graph.pages_linking_to_space(BASE_URL, space):
+            pages[pid] = title or pid
+    return [(pid, title) for pid, title in pages.items() if pid not in completed_pages]
+
+def fill_link_targets():
+    """링크 그래프의 대상 공간을 모르는 page id 를 CQL 'id in (...)' 로 묶어 조회해 (공간, 제목) 을 채움"""
+    ids = link_graph.unresolved_target_ids(BASE_URL)
+    if not ids:
         return
+    prefetch_pages(client, resolution_cache, ids)
+    infos = {}
+    for pid in ids:
+        info = cached_space_title(pid)
+        if info:
+            infos[pid] = info
+    link_graph.fill_targets(BASE_URL, infos)
+    print(f"🧭 Link targets filled: {len(infos)}/{len(ids)} page ids")
+
+def write_page(rewritten):
+    """
+    [write 단계] 새 버전 PUT. 성공 여부 반환 (plan 모드면 PUT 대신 changeset 에 기록)
+    """
+    data, new_body, drawio_versions, drawio_failed = rewritten
+    pid, title = data['id'], data['title']
+    version = data['version']['number']
 
+    space = page_space(data)
+    if changeset:
+        changeset.add_page(pid, title, space, version, data['body']['storage']['value'], new_body)
+        record_links(pid, data['body']['storage']['value'], data=data)  # 적용 전이므로 서버에 있는 본문 기준
+        print(f"📝 Planned: {title}")
+        finish_written(data, "planned", drawio_failed)
+        return True
 
-    space = data['_expandable']['space'].strip('/').split('/')[-1] #space path의 맨마지막 가지고 옴
     payload = {
         "id": pid,
         "type": "page",
@@ -445,9 +712,191 @@ def update_page(pid, title):
         "version": {"number": version + 1}
     }
 
-    put_url = f"{BASE_URL}/rest/api/content/{pid}"
-    put_res = requests.put(put_url, json=payload, headers=headers)
+    put_res = client.update_content(pid, payload)
     print(f"{'✅ Updated' if put_res.status_code == 200 else '❌ Failed'}: {title}")
+    record_links(pid, new_body if put_res.status_code == 200 else data['body']['storage']['value'], data=data)
+    if put_res.status_code == 200:
+        if drawio_versions is not None:
+            page_state.record(BASE_URL, pid, version + 1, new_body, current_ruleset_hash(), drawio_versions)
+        finish_written(data, "updated", drawio_failed)
+    elif journal:
+        journal.page_done(pid, "failed")
+    return put_res.status_code == 200
+
+def finish_written(data, status, drawio_failed):
+    """본문을 쓴(plan 기록한) 페이지의 완료 표시. draw.io 첨부가 실패했으면 partial 로 남기고 완료로 치지 않음"""
+    pid = data['id']
+    if drawio_failed:
+        print(f"⚠️ Partial (draw.io attachment failed): {data['title']}")
+        status = "partial"
+    else:
+        completed_pages.add(pid)
+    if journal:
+        journal.page_done(pid, status)
+
+def update_page(pid, title):
+    if pid in completed_pages:
+        return
+    data = fetch_page({'id': pid, 'title': title})
+    if data is None:
+        return
+    data['title'] = title
+    rewritten = rewrite_page(data)
+    if rewritten is None:
+        return
+    write_page(rewritten)
+
+def run_streaming(root_id, workers=WORKERS):
+    """
+    crawl → fetch → rewrite → write 스트리밍 실행. 발견된 페이지가 바로 다음 단계로 흘러감
+    (전체 실행이면 crawl 요청에서 본문도 받으므로 fetch 단계는 본문 누락 시에만 조회,
+     증분 실행이면 crawl 은 버전만 받고 바뀐 페이지만 fetch 단계에서 본문 조회)
+    """
+    stages = [
+        ("fetch", fetch_page, workers),
+        ("rewrite", rewrite_page, workers),
+        ("write", write_page, workers),
+    ]
+    pages = (p for p in iter_target_pages(root_id, expand_body=not INCREMENTAL) if not should_skip(p))
+    updated = run_pipeline(pages, stages, queue_size=workers * 2)
+    print(f"\n✅ Streaming run finished under root {root_id}: {updated} pages updated")
+    return updated
+
+def run_spaces(space_keys, workers=WORKERS):
+    """
+    공간 전체를 crawl → fetch → rewrite → write 스트리밍 실행 (run_streaming 의 트리 대신 공간 목록)
+    전체 실행이면 목록 요청에서 본문까지 받아 페이지별 본문 GET 없음 (요청 수 ≈ 페이지 수 / page size)
+    """
+    stages = [
+        ("fetch", fetch_page, workers),
+        ("rewrite", rewrite_page, workers),
+        ("write", write_page, workers),
+    ]
+    pages = (p for p in iter_space(space_keys, expand_body=not INCREMENTAL) if not should_skip(p))
+    updated = run_pipeline(pages, stages, queue_size=workers * 2)
+    print(f"\n✅ Space run finished for {', '.join(space_keys)}: {updated} pages updated")
+    return updated
+
+def scan_page_links(data):
+    """
+    [scan 단계] 본문 + draw.io 첨부에서 해석이 필요한 (page id 집합, tiny URL 집합, 치환할 draw.io 첨부 목록,
+    전체 후보 첨부 버전) 수집.
+    치환/조회 없음. 후보 URL 이 없는 첨부는 링크만 기록하고 목록에서 빠짐 (apply 단계에서 다시 받지 않음),
+    scan 에 실패한 첨부는 apply 단계에서 다시 처리하도록 목록에 남김
+    """
+    rules = get_link_rules(BASE_URL, ORIGIN_SPACES, TARGET_SPACE)
+    page_ids, tiny_urls = rules.references(data['body']['storage']['value'])
+    prefilter = candidate_filter(ORIGIN_SPACES)
+    drawio_attachments = []
+    listed = list(_iter_drawio_attachments(data['id']))
+    for att in listed:
+        if (data['id'], att['id']) in uploaded_attachments:
+            continue
+        try:
+            texts = scan_drawio_attachment(client, att, prefilter)  # 압축 payload 도 풀어서 본 다이어그램 평문
+        except Exception as e:
+            print(f" - draw.io attachment {attachment_name(att)}: scan error: {e}")
+            drawio_attachments.append(att)
+            continue
+        if texts:
+            drawio_attachments.append(att)
+        else:
+            record_links(data['id'], "", f"drawio:{att['id']}")
+        for text in texts:
+            ids, tinys = rules.references(text)
+            page_ids |= ids
+            tiny_urls |= tinys
+    return page_ids, tiny_urls, drawio_attachments, attachment_versions(listed)
+
+def _resolve_quietly(resolve_fn, key):
+    try:
+        resolve_fn(key)
+    except Exception as e:
+        print(f"❌ Resolve failed: {key}: {e}")
+
+def resolve_references(page_ids, tiny_urls, workers=WORKERS):
+    """
+    [resolve 단계] 고유 page id / tiny URL 을 한꺼번에 해석해 pageid_urls / short_urls 를 채움
+    page id 는 CQL 묶음 조회 후 제목 인덱스로, tiny URL 은 워커 수만큼 동시에 리다이렉트 조회
+    """
+    if target_title_index is None:
+        build_target_title_index()
+    tiny_ids = [pid for pid in map(tiny_page_id, tiny_urls) if pid] if tiny_offline else []
+    prefetch_pages(client, resolution_cache, [pid for pid in list(page_ids) + tiny_ids if pid not in pageid_urls])
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        list(ex.map(lambda pid: _resolve_quietly(resolve_target_page_id, pid), sorted(page_ids)))
+        list(ex.map(lambda url: _resolve_quietly(resolve_target_short_url, url), sorted(tiny_urls)))
+
+def run_two_phase(root_id, workers=WORKERS):
+    """
+    scan → resolve → apply 2단계 실행
+    1) root 아래 모든 페이지 본문/draw.io 첨부에서 링크 목록만 수집
+       (치환 대상이 있는 페이지만 JSON 과 후보 URL 이 있던 draw.io 첨부 목록을 apply 용으로 보관, 나머지는 여기서 완료)
+    2) 고유 링크만 일괄 해석 → API 호출 수가 링크 수가 아니라 고유 링크 수에 비례
+    3) 미리 채운 매핑으로 치환/PUT (첨부 목록 재조회 없이, 후보 URL 이 있던 첨부만 다시 받음)
+    """
+    pages, page_ids, tiny_urls = [], set(), set()
+    scanned = 0
+    lock = threading.Lock()
+    rules = get_link_rules(BASE_URL, ORIGIN_SPACES, TARGET_SPACE)
+
+    def scan(page):
+        nonlocal scanned
+        data = fetch_page(page)
+        if data is None:
+            return None
+        ids, tinys, drawio_attachments, versions = scan_page_links(data)
+        pending = drawio_attachments or rules.may_match(data['body']['storage']['value'])
+        with lock:
+            scanned += 1
+            if pending:
+                pages.append((data, drawio_attachments, versions))
+            page_ids.update(ids)
+            tiny_urls.update(tinys)
+        if not pending:
+            finish_unchanged(data, versions)
+        return data
+
+    changed = (p for p in iter_target_pages(root_id, expand_body=not INCREMENTAL) if not should_skip(p))
+    run_pipeline(changed, [("scan", scan, workers)], queue_size=workers * 2)
+    print(f"🔍 Scanned {scanned} pages ({len(pages)} with links to rewrite): "
+          f"{len(page_ids)} unique page ids, {len(tiny_urls)} unique short urls")
+
+    resolve_references(page_ids, tiny_urls, workers)
+    print(f"🧭 Resolved: {sum(1 for pid in page_ids if pageid_urls.get(pid) not in (None, pid))} page ids, "
+          f"{sum(1 for url in tiny_urls if short_urls.get(url))} short urls")
+
+    stages = [
+        ("rewrite", lambda item: rewrite_page(*item), workers),
+        ("write", write_page, workers),
+    ]
+    open_cpu_pool()
+    try:
+        updated = run_pipeline(iter(pages), stages, queue_size=workers * 2)
+    finally:
+        close_cpu_pool()
+    print(f"\n✅ Two-phase run finished under root {root_id}: {updated} pages updated")
+    return updated
+
+def open_cpu_pool(workers=None):
+    """
+    CPU_WORKERS > 0 이면 지금까지 해석한 매핑(pageid_urls / short_urls)을 복사한 프로세스 풀을 열어
+    rewrite 단계 본문 치환을 보냄 (rewrite 스레드 수 WORKERS 를 CPU_WORKERS 이상으로 둬야 코어를 다 씀)
+    """
+    global cpu_pool
+    workers = CPU_WORKERS if workers is None else workers
+    if workers > 0:
+        cpu_pool = CpuPool(workers, initializer=set_mappings, initargs=(dict(pageid_urls), dict(short_urls)))
+        set_cpu_pool(cpu_pool)  # draw.io payload 해제/재압축도 같은 풀에서
+        print(f"🧮 Rewriting bodies in {workers} processes")
+    return cpu_pool
+
+def close_cpu_pool():
+    global cpu_pool
+    if cpu_pool:
+        set_cpu_pool(None)
+        cpu_pool.close()
+        cpu_pool = None
 
 def set_variables(mode) :
     global BASE_URL, PAGE_ID, ORIGIN_SPACES, TARGET_SPACE, TESTPAGE
@@ -463,26 +912,53 @@ def set_variables(mode) :
         ORIGIN_SPACES = ['TPG']
         TARGET_SPACE = 'ARU'
         TESTPAGE = "TechStack View - Draw.io"
-if __name__ == "__main__":
-#    test_short_url()
-    # set_variables("TEST")
-    set_variables("TEST-DRAWIO")
-    update_page(PAGE_ID, TESTPAGE)
 
-    # pages = get_child_pages(ROOT_PAGE_ID)
-    # print(f"🔍 Pages under root {ROOT_PAGE_ID}: {len(pages)}")
+    client.base_url = BASE_URL  # 상대경로 헬퍼도 바뀐 서버를 보도록
+def open_changeset(resume=False):
+    """PLAN_DIR 이 있으면 plan 모드로 전환 (--resume 이면 기존 changes.jsonl 에 이어 씀)"""
+    global changeset
+    if PLAN_DIR:
+        changeset = ChangesetWriter(PLAN_DIR, resume=resume, base_url=BASE_URL, rules=current_ruleset_hash())
+        print(f"📝 Plan mode: changes are written to {PLAN_DIR}")
+    return changeset
 
-    # for pid, title in pages:
-    #     update_page(pid, title)
-    #     time.sleep(0.5)
-
-    filename = 'short_urls.csv'
+def write_short_urls_csv(filename='short_urls.csv'):
     with open(filename, mode='w', newline='', encoding='utf-8') as file:
         fieldnames = ['old_url', 'new_url']
         writer = csv.DictWriter(file, fieldnames=fieldnames)
         writer.writeheader()
-        for old_url, new_url in short_urls.items():
+        for old_url, new_url in list(short_urls.items()):
             writer.writerow({'old_url': old_url, 'new_url': new_url})
 
+    print(f"\n⚠️ Short URLs written to {filename}: {len(short_urls)}")
+
+if __name__ == "__main__":
+#    test_short_url()
+    # set_variables("TEST")
+    set_variables("TEST-DRAWIO")
+    resume = "--resume" in sys.argv[1:]  # python link-rewriter.py --resume : 중단된 실행 이어서
+    open_stores()
+    open_journal(resume)
+    open_changeset(resume)
+    try:
+        build_target_title_index()
+        update_page(PAGE_ID, TESTPAGE)
+
+        # pages = get_child_pages(ROOT_PAGE_ID)
+        # print(f"🔍 Pages under root {ROOT_PAGE_ID}: {len(pages)}")
+
+        # run_pages(pages, update_page, workers=WORKERS)
+
+        # run_streaming(ROOT_PAGE_ID)
+
+        # run_two_phase(ROOT_PAGE_ID)
+
+        # run_spaces([TARGET_SPACE])
 
-    print(f"\n⚠️ Short URLs written to short_urls.csv: {len(short_urls)}")
+        # run_pages(pages_linking_to(ORIGIN_SPACES), update_page, workers=WORKERS)  # 링크 그래프로 고른 페이지만
+    finally:
+        # 중간에 예외로 끝나도 지금까지의 매핑은 남김 (저널에도 기록되어 --resume 시 복원)
+        journal.close()
+        if changeset:
+            changeset.close()
+        write_short_urls_csv()
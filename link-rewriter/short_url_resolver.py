@@ -1,4 +1,7 @@
-import requests, csv, re, time
+import csv, time, os, sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 루트의 공용 모듈 import 용
+from confluence_client import ConfluenceClient
+from resolution_cache import ResolutionCache, DEFAULT_PATH as DEFAULT_CACHE_PATH
 
 # 설정
 USERNAME = 'your.email@example.com'
@@ -7,18 +10,38 @@ BASE_URL = 'https://yourwiki.com/wiki'
 TARGET_SPACE = 'SPACE_B'
 auth = (USERNAME, API_TOKEN)
 headers = {'Content-Type': 'application/json'}
+client = ConfluenceClient(BASE_URL, headers=headers, auth=auth)  # keep-alive 풀 + 재시도 + timeout
+resolution_cache = None  # link-rewriter.py 와 공유하는 해석 캐시 (open_cache 로 처음 쓸 때 연다)
+
+def open_cache():
+    """해석 캐시를 처음 필요할 때 연다 (import 만 해서는 현재 디렉터리에 SQLite 파일이 생기지 않도록)"""
+    global resolution_cache
+    if resolution_cache is None:
+        resolution_cache = ResolutionCache(os.getenv("CACHE_PATH") or DEFAULT_CACHE_PATH)
+    return resolution_cache
 
 def resolve_short_url(short_url):
+    resolution_cache = open_cache()
+    hit, cached = resolution_cache.get_tiny(BASE_URL, short_url)
+    if hit:
+        return cached['url'] if cached else None
     try:
-        res = requests.get(short_url, allow_redirects=True, timeout=5)
-        return res.url
+        final_url = client.resolve_tiny(short_url)
     except Exception as e:
         print(f"❌ Failed to resolve {short_url}: {e}")
         return None
+    resolution_cache.put_tiny(BASE_URL, short_url, final_url, final_url.split('/')[-1].replace('+', ' ') if final_url else None)
+    return final_url
+
+def update_page_replace_url(page_id, title, short_url, resolved_url=None):
+    if resolved_url is None:
+        resolved_url = resolve_short_url(short_url)  # 캐시 경유
+        if not resolved_url:
+            print(f"❌ Unresolved short URL in {title}: {short_url}")
+            return
 
-def update_page_replace_url(page_id, title, short_url, resolved_url):
     url = f"{BASE_URL}/rest/api/content/{page_id}?expand=body.storage,version"
-    res = requests.get(url, auth=auth)
+    res = client.get(url)
     if res.status_code != 200:
         print(f"❌ Failed to get {title}")
         return
@@ -42,10 +65,11 @@ def update_page_replace_url(page_id, title, short_url, resolved_url):
     }
 
     put_url = f"{BASE_URL}/rest/api/content/{page_id}"
-    put_res = requests.put(put_url, json=payload, auth=auth, headers=headers)
+    put_res = client.put(put_url, json=payload)
     print(f"{'✅ Replaced' if put_res.status_code == 200 else '❌ Failed'}: {title}")
 
 if __name__ == "__main__":
+    open_cache()
     with open('short_urls.csv', 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         rows = list(reader)
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+link_graph.py
+- 페이지 본문/draw.io 첨부를 처리하면서 본 링크를 SQLite 파일에 저장하는 링크 그래프: 원본 페이지 → 대상 (page id / 공간 / 제목), 링크 종류별
+    display : /display/{SPACE}/{TITLE}                   → 공간 + 제목
+    spaces  : /spaces/{SPACE}/pages/{ID}                 → 공간 + id
+    pageid  : BASE/pages/viewpage.action?pageId={ID}     → id (공간/제목은 page_info 콜백이 알면 채움)
+    tiny    : BASE/x/{CODE}                              → tiny 코드 + 디코딩한 id (tiny_code 가 서버와 맞을 때만 디코딩,
+                                                            아니면 id 없이 저장. 공간/제목은 pageid 와 같이)
+    (pageid / tiny 는 BASE 또는 BASE 의 컨텍스트 경로로 시작하는 상대경로만 — 다른 서버의 같은 형식 링크는 제외)
+    ri_page : <ri:page ri:space-key=… ri:content-title=…> → 공간(없으면 원본 페이지 공간) + 제목 (Confluence 내부 링크)
+  공간 여부와 무관하게 모든 링크를 기록 → 다음 공간 이동 때 설정이 달라도 그대로 사용
+- 증분 갱신: record() 는 (원본 페이지, origin=body / drawio:{첨부 id}) 단위로 이전 기록을 지우고 새로 씀
+  → 다시 처리한 페이지만 바뀌고 나머지 그래프는 유지
+- 조회: pages_linking_to_space("TR") / pages_linking_to_page("123") → 해당 공간/페이지로 들어오는 링크가 있는 원본 페이지 (id, 제목)
+  (대상 공간/id 인덱스 사용, 전체 트리 crawl 없이 영향받는 페이지만 처리 가능)
+- 기록 때 공간을 몰랐던 pageid/tiny 링크(해석 캐시에 없던 id)는 unresolved_target_ids() 로 모아 묶음 조회 후 fill_targets() 로 채움,
+  그래도 모르는 대상(삭제/권한 없음, 디코딩하지 않은 tiny)은 pages_linking_to_space 가 기본으로 포함 (공간을 몰라 빠뜨리는 페이지가 없도록)
+"""
+
+from typing import Callable, Counter, Dict, Iterable, List, Optional, Tuple
+from collections import Counter as _Counter
+from urllib.parse import unquote_plus, urlparse
+import html
+import re
+import sqlite3
+import threading
+import time
+
+from tiny_code import decode_tiny
+
+DEFAULT_PATH = "link_graph.sqlite3"
+
+# (kind, target, target_id, target_space, target_title) → 횟수
+LinkCounts = Counter[Tuple[str, str, Optional[str], Optional[str], Optional[str]]]
+
+_RI_ATTR = re.compile(r'ri:(space-key|content-title)="([^"]*)"')
+_patterns: Dict[Optional[str], "re.Pattern[str]"] = {}
+
+
+def _link_pattern(base_url: Optional[str]) -> "re.Pattern[str]":
+    """base_url 별 링크 패턴 (pageid / tiny 는 base_url 또는 그 컨텍스트 경로의 상대경로로 시작하는 것만)"""
+    pattern = _patterns.get(base_url)
+    if pattern is None:
+        # 상대경로: 앞이 호스트/경로 문자가 아닌 곳에서 시작 (href="/wiki/x/.. 는 되고 https://other/wiki/x/.. 는 안 됨)
+        context = re.escape(urlparse(base_url).path.rstrip("/")) if base_url else ""
+        anchor = rf"(?:{re.escape(base_url.rstrip('/'))}|(?<![\w.:/-]){context})" if base_url else rf"(?<![\w.:/-])"
+        pattern = _patterns[base_url] = re.compile(
+            r"/display/(?P<d_space>[A-Za-z0-9_~-]+)/(?P<d_title>[^\"'<>\s?#&;]+)"
+            r"|/spaces/(?P<s_space>[A-Za-z0-9_~-]+)/pages/(?P<s_id>\d+)"
+            rf"|{anchor}/pages/viewpage\.action\?pageId=(?P<p_id>\d+)"
+            rf"|{anchor}/x/(?P<tiny>[A-Za-z0-9_-]+)"
+            r"|<ri:page\b(?P<ri>[^>]*)>"
+        )
+    return pattern
+
+
+def extract_links(text: str, source_space: Optional[str] = None,
+                  page_info: Optional[Callable[[str], Optional[Tuple[str, str]]]] = None,
+                  base_url: Optional[str] = None, decode_tiny_ids: bool = False) -> LinkCounts:
+    """
+    text 의 링크를 종류별로 모아 횟수와 함께 반환. 조회 없음.
+    page_info(page_id) → (space, title) 를 주면 pageid 링크의 대상 공간/제목을 채움 (캐시만 보는 함수를 넘길 것)
+    base_url 을 주면 그 서버의 pageid / tiny 링크만 (없으면 상대경로만), decode_tiny_ids 는 tiny_code.codec_matches 로
+    서버와 대조한 뒤에만 켤 것 (아니면 tiny 링크는 id 없이 저장)
+    """
+    counts: LinkCounts = _Counter()
+    for m in _link_pattern(base_url).finditer(text):
+        if m.group("d_space"):
+            space, title = m.group("d_space"), unquote_plus(m.group("d_title"))
+            counts[("display", f"{space}/{title}", None, space, title)] += 1
+        elif m.group("s_space"):
+            space, page_id = m.group("s_space"), m.group("s_id")
+            counts[("spaces", page_id, page_id, space, None)] += 1
+        elif m.group("p_id"):
+            page_id = m.group("p_id")
+            info = page_info(page_id) if page_info else None
+            counts[("pageid", page_id, page_id, info[0] if info else None, info[1] if info else None)] += 1
+        elif m.group("tiny"):
+            page_id = decode_tiny(m.group("tiny")) if decode_tiny_ids else None
+            info = page_info(page_id) if page_info and page_id else None
+            counts[("tiny", m.group("tiny"), page_id, info[0] if info else None, info[1] if info else None)] += 1
+        else:
+            attrs = {k: html.unescape(v) for k, v in _RI_ATTR.findall(m.group("ri"))}
+            title = attrs.get("content-title")
+            if title:
+                space = attrs.get("space-key") or source_space
+                counts[("ri_page", f"{space}/{title}", None, space, title)] += 1
+    return counts
+
+
+class LinkGraph:
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS links ("
+            " base_url TEXT NOT NULL, source_id TEXT NOT NULL, origin TEXT NOT NULL,"
+            " kind TEXT NOT NULL, target TEXT NOT NULL,"
+            " target_id TEXT, target_space TEXT, target_title TEXT, count INTEGER NOT NULL,"
+            " PRIMARY KEY (base_url, source_id, origin, kind, target));"
+            "CREATE INDEX IF NOT EXISTS links_by_space ON links (base_url, target_space);"
+            "CREATE INDEX IF NOT EXISTS links_by_id ON links (base_url, target_id);"
+            "CREATE TABLE IF NOT EXISTS sources ("
+            " base_url TEXT NOT NULL, source_id TEXT NOT NULL, space TEXT, title TEXT, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (base_url, source_id));"
+        )
+        self._conn.commit()
+
+    def record(self, base_url: str, source_id: str, links: LinkCounts, origin: str = "body",
+               source_space: Optional[str] = None, source_title: Optional[str] = None):
+        """source_id 의 origin(body / drawio:{첨부 id}) 링크를 links 로 교체"""
+        rows = [(base_url, str(source_id), origin, kind, target, target_id, space, title, n)
+                for (kind, target, target_id, space, title), n in links.items()]
+        with self._lock:
+            with self._conn:  # 한 트랜잭션 (중간에 죽어도 페이지 단위로 이전/새 기록 중 하나)
+                self._conn.execute("DELETE FROM links WHERE base_url=? AND source_id=? AND origin=?",
+                                   (base_url, str(source_id), origin))
+                self._conn.executemany("INSERT INTO links VALUES (?,?,?,?,?,?,?,?,?)", rows)
+                self._conn.execute(
+                    "INSERT INTO sources (base_url, source_id, space, title, updated_at) VALUES (?,?,?,?,?)"
+                    " ON CONFLICT(base_url, source_id) DO UPDATE SET"
+                    " space=COALESCE(excluded.space, space), title=COALESCE(excluded.title, title),"
+                    " updated_at=excluded.updated_at",
+                    (base_url, str(source_id), source_space, source_title, time.time()),
+                )
+
+    def record_text(self, base_url: str, source_id: str, text: str, origin: str = "body",
+                    source_space: Optional[str] = None, source_title: Optional[str] = None,
+                    page_info: Optional[Callable[[str], Optional[Tuple[str, str]]]] = None,
+                    decode_tiny_ids: bool = False):
+        self.record(base_url, source_id, extract_links(text, source_space, page_info, base_url, decode_tiny_ids),
+                    origin, source_space, source_title)
+
+    def _sources(self, base_url: str, where: str, args: List[str]) -> List[Tuple[str, Optional[str]]]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT l.source_id, s.title FROM (SELECT DISTINCT source_id FROM links WHERE {where}) l"
+                " LEFT JOIN sources s ON s.base_url=? AND s.source_id=l.source_id ORDER BY l.source_id",
+                args + [base_url],
+            ).fetchall()
+        return [(r[0], r[1]) for r in rows]
+
+    def pages_linking_to_space(self, base_url: str, space_key: str,
+                               include_unresolved: bool = True) -> List[Tuple[str, Optional[str]]]:
+        """
+        space_key 로 들어오는 링크가 있는 원본 페이지 (id, 제목).
+        include_unresolved 면 대상 공간을 모르는 pageid/tiny 링크(디코딩하지 않은 tiny 포함)가 있는 페이지도 포함
+        """
+        where = "base_url=? AND target_space=?"
+        if include_unresolved:
+            where = f"{where} OR (base_url=? AND target_space IS NULL AND kind IN ('pageid', 'tiny'))"
+            return self._sources(base_url, where, [base_url, space_key, base_url])
+        return self._sources(base_url, where, [base_url, space_key])
+
+    def unresolved_target_ids(self, base_url: str) -> List[str]:
+        """대상 공간을 모르는 id 링크(pageid/tiny)의 대상 page id"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT target_id FROM links"
+                " WHERE base_url=? AND target_space IS NULL AND target_id IS NOT NULL ORDER BY target_id",
+                (base_url,),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def fill_targets(self, base_url: str, infos: Dict[str, Tuple[str, str]]):
+        """page id → (공간, 제목) 으로 대상 공간을 모르던 링크를 채움"""
+        rows = [(space, title, base_url, str(page_id)) for page_id, (space, title) in infos.items()]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE links SET target_space=?, target_title=?"
+                    " WHERE base_url=? AND target_id=? AND target_space IS NULL", rows)
+
+    def pages_linking_to_page(self, base_url: str, page_id: str, space_key: Optional[str] = None,
+                              title: Optional[str] = None) -> List[Tuple[str, Optional[str]]]:
+        """page_id 로 들어오는 링크가 있는 원본 페이지 (id, 제목). space_key/title 을 주면 제목 링크(display/ri:page)도 포함"""
+        where = "base_url=? AND target_id=?"
+        args = [base_url, str(page_id)]
+        if space_key and title:
+            where = f"({where}) OR (base_url=? AND target_space=? AND target_title=?)"
+            args += [base_url, space_key, title]
+        return self._sources(base_url, where, args)
+
+    def outbound(self, base_url: str, source_id: str) -> List[Dict[str, object]]:
+        """source_id 가 가진 링크 목록"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT origin, kind, target, target_id, target_space, target_title, count FROM links"
+                " WHERE base_url=? AND source_id=? ORDER BY origin, kind, target",
+                (base_url, str(source_id)),
+            ).fetchall()
+        keys = ("origin", "kind", "target", "target_id", "target_space", "target_title", "count")
+        return [dict(zip(keys, r)) for r in rows]
+
+    def forget(self, base_url: str, source_ids: Iterable[str]):
+        """삭제된 페이지 등 기록 제거"""
+        ids = [(base_url, str(s)) for s in source_ids]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("DELETE FROM links WHERE base_url=? AND source_id=?", ids)
+                self._conn.executemany("DELETE FROM sources WHERE base_url=? AND source_id=?", ids)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
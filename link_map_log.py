@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+link_map_log.py
+- 링크 치환 로그(link_map.csv)와 short URL 목록을 실행 중에 바로 파일로 쓰는 CSV 로그
+- 경로가 .gz 로 끝나면 gzip 압축해서 기록
+- 한 번에 한 페이지 분량을 쓰고 바로 flush → 메모리는 페이지 하나 분량만, 중간에 죽어도 그때까지 쓴 로그는 남음
+  (gzip 은 sync flush 라 zcat 등으로 읽을 수 있음, 마지막 trailer 만 없음)
+- 같은 페이지 안의 같은 (from, to, type, ...) 은 한 줄로 합치고 count 컬럼에 횟수 기록
+- 여러 워커 스레드에서 동시에 써도 되도록 lock 으로 보호
+"""
+
+from typing import Any, Counter, Dict, Iterable, List, Tuple
+import csv
+import gzip
+import threading
+
+LINK_MAP_FIELDS = [
+    'page_id', 'page_title',
+    'from_text', 'from_type',
+    'to_text', 'to_type',
+    'status', 'note', 'count',
+]
+
+SHORT_URL_FIELDS = ['title', 'page_id', 'short_url', 'count']
+
+
+class StreamingCsvLog:
+    def __init__(self, path: str, fieldnames: List[str]):
+        self.path = path
+        self.rows = 0
+        self._lock = threading.Lock()
+        if path.endswith(".gz"):
+            self._file = gzip.open(path, "wt", newline="", encoding="utf-8")
+        else:
+            self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames)
+        self._writer.writeheader()
+        self._file.flush()
+
+    def write_rows(self, rows: Iterable[Dict[str, Any]]):
+        rows = list(rows)
+        with self._lock:
+            self._writer.writerows(rows)
+            self._file.flush()
+            self.rows += len(rows)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def counted_rows(base: Dict[str, Any], counts: Counter[Tuple], keys: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    """
+    counts 의 (keys 순서 값 튜플) → 횟수 를 base(page_id 등 공통 컬럼) 와 합쳐 CSV 행으로.
+    예: counted_rows({'page_id': 1}, Counter({('a', 'b'): 3}), ('from_text', 'to_text'))
+        → [{'page_id': 1, 'from_text': 'a', 'to_text': 'b', 'count': 3}]
+    """
+    return [dict(base, **dict(zip(keys, values)), count=n) for values, n in counts.items()]
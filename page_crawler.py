@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+page_crawler.py
+- /rest/api/content/{id}/child/page 를 _links.next 로 끝까지 페이지네이션 (children.page expand 의 기본 개수 잘림 없음)
+- 형제 하위 트리를 스레드 풀로 동시에 탐색, 발견 즉시 yield (제너레이터)
+- expand="body.storage,version" 을 주면 같은 요청에서 본문/버전까지 받아 페이지별 재조회 불필요
+- 이미 본 page id 는 다시 탐색하지 않음 (중복/순환 방지)
+"""
+
+from typing import Iterator, Optional, Dict, Any
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from confluence_client import ConfluenceClient
+
+
+def iter_page_tree(client: ConfluenceClient, root_id: str,
+                   expand: Optional[str] = None, workers: int = 4,
+                   page_size: int = 100) -> Iterator[Dict[str, Any]]:
+    """
+    root 페이지와 모든 하위 페이지 JSON 을 발견 순서대로 yield.
+    동시에 목록을 조회하는 노드 수는 workers*2 로 제한 (완료된 결과가 쌓여 메모리가 커지지 않도록).
+    """
+    root = client.get_content(root_id, expand)
+    seen = {root["id"]}
+    yield root
+
+    todo = deque([root["id"]])
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        pending = {}
+        while todo or pending:
+            while todo and len(pending) < workers * 2:
+                pid = todo.popleft()
+                pending[ex.submit(lambda p: list(client.child_pages(p, expand, page_size)), pid)] = pid
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                parent_id = pending.pop(fut)
+                try:
+                    children = fut.result()
+                except Exception as e:
+                    print(f"❌ Failed to get children of {parent_id}: {e}")
+                    continue
+                for child in children:
+                    if child["id"] in seen:
+                        print(f"⚠️ Duplicate page skipped: {child['id']} (under {parent_id})")
+                        continue
+                    seen.add(child["id"])
+                    todo.append(child["id"])
+                    yield child
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+page_prefetch.py
+- 본문/다이어그램에 나오는 viewpage.action?pageId=N 의 id 를 먼저 모아 (space, title) 을 묶음 조회
+- CQL 'id in (...)' + expand=space 로 chunk_size 개씩 조회 → 링크마다 GET /rest/api/content/{id} 하던 왕복을 chunk 단위로
+- 결과는 ResolutionCache(put_page) 에 기록 → 이후 get_page_space_title / _get_space_title_by_id 가 캐시에서 응답
+- 이미 캐시에 있는 id 는 다시 조회하지 않음
+- CQL 결과에 없는 id(삭제/권한 없음)는 기록하지 않음 → 기존 단건 조회가 404 를 판정해 negative 로 기록
+"""
+
+from typing import Iterable, List
+import re
+
+from confluence_client import ConfluenceClient
+from resolution_cache import ResolutionCache
+
+PAGE_ID_PATTERN = re.compile(r"pageId=(\d+)")
+
+DEFAULT_CHUNK_SIZE = 50
+
+
+def collect_page_ids(text: str) -> List[str]:
+    """텍스트 안의 pageId=N 값 (중복 제거, 등장 순서 유지)"""
+    return list(dict.fromkeys(PAGE_ID_PATTERN.findall(text)))
+
+
+def prefetch_pages(client: ConfluenceClient, cache: ResolutionCache, page_ids: Iterable[str],
+                   chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    캐시에 없는 page id 들의 (space, title) 을 묶음 조회해 캐시에 기록하고 기록한 개수 반환.
+    조회 실패는 출력만 하고 넘어감 (단건 조회 경로가 그대로 남아 있으므로).
+    """
+    missing = [pid for pid in dict.fromkeys(page_ids) if not cache.get_page(client.base_url, pid)[0]]
+    if not missing:
+        return 0
+
+    found = 0
+    try:
+        for content in client.get_contents_by_ids(missing, expand="space", chunk_size=chunk_size):
+            cache.put_page(client.base_url, content["id"], content["space"]["key"], content["title"])
+            found += 1
+    except Exception as e:
+        print(f"⚠️ Page id prefetch failed ({len(missing)} ids): {e}")
+    return found
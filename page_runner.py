@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+page_runner.py
+- (page_id, title) 목록/제너레이터를 update_page 류 함수로 처리하는 공용 실행기
+- workers == 1 : 기존 __main__ 루프와 동일 (순차 + delay)
+- workers  > 1 : 최대 workers 개 페이지를 동시에 처리, 대기 작업 수도 workers*2 로 제한
+- 한 페이지의 fetch → rewrite → PUT 는 하나의 작업 안에서 순서대로 수행, 같은 page id 는 한 번만 처리
+- 한 페이지의 예외는 해당 페이지 실패로만 출력하고 나머지는 계속 진행
+"""
+
+from typing import Iterable, Tuple, Callable, Any
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+
+def _run_one(update_fn: Callable[[str, str], Any], pid: str, title: str):
+    try:
+        update_fn(pid, title)
+    except Exception as e:
+        print(f"❌ Error: {title} ({pid}): {e}")
+
+
+def run_pages(pages: Iterable[Tuple[str, str]], update_fn: Callable[[str, str], Any],
+              workers: int = 1, delay: float = 0.5) -> int:
+    """
+    pages 를 update_fn(pid, title) 으로 처리하고 처리한 페이지 수 반환.
+    delay 는 작업(워커)마다 페이지 처리 후 대기 시간 → 전체 처리율 상한은 workers / delay.
+    """
+    seen = set()
+    count = 0
+
+    if workers <= 1:
+        for pid, title in pages:
+            if pid in seen:
+                continue
+            seen.add(pid)
+            _run_one(update_fn, pid, title)
+            count += 1
+            if delay:
+                time.sleep(delay)
+        return count
+
+    slots = threading.BoundedSemaphore(workers * 2)
+
+    def task(pid, title):
+        try:
+            _run_one(update_fn, pid, title)
+            if delay:
+                time.sleep(delay)
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for pid, title in pages:
+            if pid in seen:
+                continue
+            seen.add(pid)
+            slots.acquire()
+            ex.submit(task, pid, title)
+            count += 1
+    return count
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+page_selector.py
+- 설정(ORIGIN_SPACES)으로 CQL 텍스트 검색을 만들어 치환 대상 링크가 있을 법한 페이지만 고름
+    type = page AND ancestor = ROOT AND (text ~ "display/TR" OR text ~ "spaces/TR/pages" OR text ~ "pageId" OR text ~ "x")
+  (root 대신 space_key 를 주면 space = KEY)
+- 검색 결과 expand=version → 증분 실행(page_state)의 버전 비교를 그대로 사용
+- 검색 색인은 토큰 단위라 결과가 넓게 나오는 쪽(치환할 것 없는 페이지 포함)은 괜찮지만, 색인이 비었거나/오래됐거나/
+  검색이 실패하면 빠지는 페이지가 생김 → 아래 경우 None 반환, 호출 쪽은 전체 crawl 로 fallback
+    - 검색 요청 실패 (HTTP 오류 등)
+    - 목록 API 로 받은 실제 하위 페이지 일부(SAMPLE_SIZE)가 검색 범위(type = page AND ancestor/space)에 없음
+      (색인 안 됨 / 색인 지연 / 권한 차이)
+    - may_match(치환 규칙의 키워드 필터)를 주면 같은 샘플의 본문에 돌려, 걸리는 페이지가 검색 결과에 없음
+      (색인 토큰화 때문에 검색어로는 안 걸리는 링크 형식 → 검색으로 고르면 빠지는 페이지가 있음)
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+from itertools import islice
+
+from confluence_client import ConfluenceClient
+
+SAMPLE_SIZE = 25  # 색인 확인용으로 대조할 실제 하위 페이지 수
+
+
+def link_search_terms(origin_spaces: List[str], include_tiny: bool = True) -> List[str]:
+    """치환 규칙(link_rules)이 찾는 링크의 검색어: /display/{S}/, /spaces/{S}/pages/, pageId=, tiny /x/"""
+    terms = []
+    for space in origin_spaces:
+        terms += [f"display/{space}", f"spaces/{space}/pages"]
+    terms.append("pageId")
+    if include_tiny:
+        terms.append("x")  # tiny 링크 /x/CODE: 토큰이 짧아 넓게 걸림 (빠지는 것보다 나음)
+    return terms
+
+
+def _cql_quote(s: str) -> str:
+    return '"' + s.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _scope_cql(root_id: Optional[str], space_key: Optional[str]) -> str:
+    if root_id:
+        return f"type = page AND ancestor = {root_id}"
+    return f"type = page AND space = {_cql_quote(space_key)}"
+
+
+def link_search_cql(origin_spaces: List[str], root_id: Optional[str] = None, space_key: Optional[str] = None,
+                    include_tiny: bool = True) -> str:
+    terms = " OR ".join(f"text ~ {_cql_quote(t)}" for t in link_search_terms(origin_spaces, include_tiny))
+    return f"{_scope_cql(root_id, space_key)} AND ({terms})"
+
+
+def _sample_pages(client: ConfluenceClient, root_id: Optional[str], space_key: Optional[str],
+                  expand: Optional[str] = None) -> List[Dict[str, Any]]:
+    """목록 API 로 받은 실제 하위 페이지 SAMPLE_SIZE 개"""
+    if root_id:
+        return list(islice(client.child_pages(root_id, expand=expand, page_size=SAMPLE_SIZE), SAMPLE_SIZE))
+    return list(islice(client.list_content(space_key, expand=expand, page_size=SAMPLE_SIZE), SAMPLE_SIZE))
+
+
+def _index_looks_complete(client: ConfluenceClient, root_id: Optional[str], space_key: Optional[str],
+                          sample: List[Dict[str, Any]]) -> bool:
+    """실제 하위 페이지(목록 API) 일부가 검색 색인에도 있는지 확인"""
+    actual = [p["id"] for p in sample]
+    if not actual:
+        return True  # 확인할 하위 페이지 없음
+    ids = ",".join(actual)
+    indexed = {p["id"] for p in client.content_search(f"{_scope_cql(root_id, space_key)} AND id in ({ids})",
+                                                       limit=SAMPLE_SIZE)}
+    missing = set(actual) - indexed
+    if missing:
+        print(f"⚠️ Search index is missing {len(missing)}/{len(actual)} sampled pages")
+    return not missing
+
+
+def _search_covers(sample: List[Dict[str, Any]], selected: List[Dict[str, Any]],
+                   may_match: Callable[[str], bool]) -> bool:
+    """샘플 중 본문이 may_match 에 걸리는 페이지가 모두 검색 결과에 있는지 확인"""
+    selected_ids = {p["id"] for p in selected}
+    matching = [p["id"] for p in sample
+                if may_match(((p.get("body") or {}).get("storage") or {}).get("value") or "")]
+    missing = [pid for pid in matching if pid not in selected_ids]
+    if missing:
+        print(f"⚠️ Link search missed {len(missing)}/{len(matching)} sampled pages with links: {', '.join(missing[:5])}")
+    return not missing
+
+
+def select_pages(client: ConfluenceClient, origin_spaces: List[str],
+                 root_id: Optional[str] = None, space_key: Optional[str] = None,
+                 include_tiny: bool = True, page_size: int = 100,
+                 may_match: Optional[Callable[[str], bool]] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    치환 대상 링크가 있을 법한 페이지 JSON(expand=version) 목록. 검색을 믿을 수 없으면 None (→ 전체 crawl).
+    root_id 를 주면 root 아래(root 자신 제외), 아니면 space_key 공간 전체.
+    may_match(본문 → 치환 대상 키워드가 있는지)를 주면 샘플 본문으로 검색 결과 누락도 확인.
+    """
+    try:
+        sample = _sample_pages(client, root_id, space_key, "body.storage" if may_match else None)
+        if not _index_looks_complete(client, root_id, space_key, sample):
+            return None
+        cql = link_search_cql(origin_spaces, root_id, space_key, include_tiny)
+        selected = list(client.content_search(cql, limit=page_size, expand="version"))
+        if may_match is not None and not _search_covers(sample, selected, may_match):
+            return None
+        return selected
+    except Exception as e:
+        print(f"⚠️ CQL page selection failed: {e}")
+        return None
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+page_state.py
+- 지난 실행에서 처리한 페이지 상태를 SQLite 파일에 저장: (base_url, page id) → 버전, 본문 해시, 규칙 해시, 첨부 해시
+- 목록 조회(expand=version)의 버전이 기록과 같고 규칙(BASE_URL/ORIGIN_SPACES/TARGET_SPACE)도 같으면
+  본문을 받기 전에 건너뜀 → 야간 재실행은 지난 실행 이후 수정된 페이지만 처리
+- 첨부 새 버전은 페이지 버전을 올리지 않음 → draw.io 첨부 {id: 버전} 해시(attachments_hash)도 함께 기록하고 비교
+  (is_unchanged 에 현재 첨부 해시를 구하는 함수를 넘기면 버전/규칙이 같을 때만 호출)
+- 기록 시점: "No change" 판정 시 현재 버전, PUT 성공 시 새 버전(version + 1)과 새 본문 해시
+  (draw.io 첨부 처리에 실패했거나 plan 모드로 기록만 한 첨부가 있으면 기록하지 않음 → 다음 실행에서 다시 처리)
+- 지난 실행에서 못 찾은 대상 페이지가 나중에 생긴 경우는 버전이 같으면 건너뛰므로 전체 재실행(FULL_RUN=1)으로 처리
+"""
+
+from typing import Callable, Dict, Iterable, Optional
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_PATH = "page_state.sqlite3"
+
+
+def body_hash(body: str) -> str:
+    return hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+
+def ruleset_hash(base_url: str, origin_spaces: Iterable[str], target_space: str) -> str:
+    """치환 결과를 좌우하는 설정 조합의 해시 (설정이 바뀌면 모든 페이지를 다시 처리)"""
+    key = json.dumps([base_url, sorted(origin_spaces), target_space])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def attachments_hash(versions: Dict[str, Optional[int]]) -> str:
+    """draw.io 첨부 {id: 버전} 의 해시 (첨부가 없어도 빈 목록의 해시 → 나중에 생긴 첨부도 감지)"""
+    key = json.dumps(sorted(versions.items()))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class PageState:
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " base_url TEXT NOT NULL, page_id TEXT NOT NULL,"
+            " version INTEGER NOT NULL, body_hash TEXT, rules_hash TEXT NOT NULL, updated_at REAL NOT NULL,"
+            " attachments_hash TEXT,"
+            " PRIMARY KEY (base_url, page_id))"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(pages)")}
+        if "attachments_hash" not in columns:  # 이전 형식 파일
+            self._conn.execute("ALTER TABLE pages ADD COLUMN attachments_hash TEXT")
+        self._conn.commit()
+
+    def get(self, base_url: str, page_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, body_hash, rules_hash, attachments_hash FROM pages WHERE base_url=? AND page_id=?",
+                (base_url, str(page_id)),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"version": row[0], "body_hash": row[1], "rules_hash": row[2], "attachments_hash": row[3]}
+
+    def is_unchanged(self, base_url: str, page_id: str, version: Optional[int], rules_hash: str,
+                     current_attachments_hash: Optional[Callable[[], str]] = None) -> bool:
+        """
+        기록된 버전/규칙 해시와 같으면 True (버전을 모르면 False)
+        current_attachments_hash 를 주면 버전/규칙이 같을 때 호출해 기록된 첨부 해시와도 비교
+        """
+        if version is None:
+            return False
+        prev = self.get(base_url, page_id)
+        if prev is None or prev["version"] != version or prev["rules_hash"] != rules_hash:
+            return False
+        return current_attachments_hash is None or prev["attachments_hash"] == current_attachments_hash()
+
+    def record(self, base_url: str, page_id: str, version: int, body: Optional[str], rules_hash: str,
+               attachments: Optional[Dict[str, Optional[int]]] = None):
+        """attachments: 처리 후 draw.io 첨부 {id: 버전} (attachments_hash 로 저장)"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages"
+                " (base_url, page_id, version, body_hash, rules_hash, updated_at, attachments_hash)"
+                " VALUES (?,?,?,?,?,?,?)",
+                (base_url, str(page_id), int(version), body_hash(body) if body is not None else None,
+                 rules_hash, time.time(), attachments_hash(attachments) if attachments is not None else None),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+pipeline.py
+- crawl → fetch → rewrite → write 처럼 단계별 스레드를 bounded queue 로 연결하는 스트리밍 실행기
+- source(제너레이터)에서 나온 항목이 바로 다음 단계로 흘러가므로 첫 페이지 처리가 즉시 시작되고,
+  큐 크기 제한으로 트리 크기와 무관하게 메모리 사용량이 일정
+- 각 단계는 자기 워커 수만큼 병렬로 돌며 네트워크 대기가 단계 간에 겹침
+- 한 항목은 단계를 순서대로 통과 (한 페이지의 fetch → rewrite → write 순서 보장)
+"""
+
+from typing import Iterable, List, Tuple, Callable, Any, Optional
+import queue
+import threading
+
+_STOP = object()
+
+# (단계 이름, 처리 함수, 워커 수). 처리 함수가 None 을 반환하면 해당 항목은 그 단계에서 종료
+# 마지막 단계는 성공 여부를 반환 (False 등 거짓 값은 완료 수에서 빠짐, 예: write 단계의 PUT 실패)
+Stage = Tuple[str, Callable[[Any], Optional[Any]], int]
+
+
+def run_pipeline(source: Iterable[Any], stages: List[Stage], queue_size: int = 16) -> int:
+    """
+    source 항목을 stages 순서대로 흘려보내고, 마지막 단계가 참(성공)을 반환한 항목 수 반환.
+    단계 함수의 예외는 해당 항목만 버리고 계속 진행. source 의 예외는 정리 후 다시 발생.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    lock = threading.Lock()
+    completed = [0]
+    threads = []
+
+    for i, (name, fn, workers) in enumerate(stages):
+        in_q = queues[i]
+        out_q = queues[i + 1] if i + 1 < len(stages) else None
+        remaining = [max(1, workers)]
+
+        def worker(name=name, fn=fn, in_q=in_q, out_q=out_q, remaining=remaining):
+            while True:
+                item = in_q.get()
+                if item is _STOP:
+                    in_q.put(_STOP)  # 같은 단계의 다른 워커에게도 종료 전달
+                    with lock:
+                        remaining[0] -= 1
+                        last = remaining[0] == 0
+                    if last and out_q is not None:
+                        out_q.put(_STOP)
+                    return
+                try:
+                    out = fn(item)
+                except Exception as e:
+                    print(f"❌ {name} failed: {e}")
+                    continue
+                if out is None:
+                    continue
+                if out_q is not None:
+                    out_q.put(out)
+                elif out:
+                    with lock:
+                        completed[0] += 1
+
+        for _ in range(remaining[0]):
+            t = threading.Thread(target=worker, name=f"{name}-worker", daemon=True)
+            t.start()
+            threads.append(t)
+
+    try:
+        for item in source:
+            queues[0].put(item)
+    finally:
+        queues[0].put(_STOP)
+        for t in threads:
+            t.join()
+
+    return completed[0]
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+resolution_cache.py
+- 링크 해석 결과를 SQLite 파일에 저장해 재실행/TEST↔운영 전환(set_variables) 시 재사용
+- 종류(kind)
+    tiny   : tiny URL            → {"url": 최종 URL, "title": 제목}
+    page   : pageId              → {"space": 공간키, "title": 제목}
+    target : (space, title)      → {"id": ..., "title": ..., "webui": ..., "tinyui": ...}
+- 모든 키에 base_url 포함 (서버별로 분리 저장)
+- TTL 만료 항목은 없는 것으로 취급, 404 는 negative 항목(value=NULL)으로 짧은 TTL 동안 기억
+- 파일 DB 는 WAL + synchronous=NORMAL: put 마다 commit 해도 fsync 는 checkpoint 때만
+  (워커 스레드가 링크마다 put 해도 디스크 동기화 비용 없음, 프로세스가 죽어도 commit 한 항목은 남음)
+"""
+
+from typing import Optional, Tuple, Dict, Any
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_PATH = "resolution_cache.sqlite3"
+DEFAULT_TTL = 7 * 24 * 3600        # 양성 결과: 7일
+DEFAULT_NEGATIVE_TTL = 24 * 3600   # 404 결과: 1일
+
+
+class ResolutionCache:
+    def __init__(self, path: str = DEFAULT_PATH,
+                 ttl: float = DEFAULT_TTL, negative_ttl: float = DEFAULT_NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " kind TEXT NOT NULL, base_url TEXT NOT NULL, key TEXT NOT NULL,"
+            " value TEXT, expires_at REAL NOT NULL,"
+            " PRIMARY KEY (kind, base_url, key))"
+        )
+        self._conn.commit()
+
+    # ---- 공통 ----
+    def get(self, kind: str, base_url: str, key: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """(hit 여부, 값). negative 항목은 (True, None)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM entries WHERE kind=? AND base_url=? AND key=?",
+                (kind, base_url, key),
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return False, None
+        return True, (json.loads(row[0]) if row[0] is not None else None)
+
+    def put(self, kind: str, base_url: str, key: str, value: Optional[Dict[str, Any]]):
+        """value=None 이면 negative 항목으로 저장."""
+        ttl = self.ttl if value is not None else self.negative_ttl
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (kind, base_url, key, value, expires_at) VALUES (?,?,?,?,?)",
+                (kind, base_url, key,
+                 json.dumps(value, ensure_ascii=False) if value is not None else None,
+                 time.time() + ttl),
+            )
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM entries WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+            return cur.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ---- 종류별 헬퍼 ----
+    def get_tiny(self, base_url: str, short_url: str):
+        return self.get("tiny", base_url, short_url)
+
+    def put_tiny(self, base_url: str, short_url: str, final_url: Optional[str], title: Optional[str]):
+        self.put("tiny", base_url, short_url, {"url": final_url, "title": title} if final_url else None)
+
+    def get_page(self, base_url: str, page_id: str):
+        return self.get("page", base_url, str(page_id))
+
+    def put_page(self, base_url: str, page_id: str, space: Optional[str], title: Optional[str]):
+        self.put("page", base_url, str(page_id), {"space": space, "title": title} if space else None)
+
+    def get_target(self, base_url: str, space_key: str, title: str):
+        return self.get("target", base_url, f"{space_key}\n{title}")
+
+    def put_target(self, base_url: str, space_key: str, title: str, info: Optional[Dict[str, Any]]):
+        self.put("target", base_url, f"{space_key}\n{title}", info)
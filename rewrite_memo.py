@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+rewrite_memo.py
+- URL 치환 결과(원래 URL → 새 URL 또는 None)를 실행 동안 메모리에 기억
+- 같은 URL 이 여러 다이어그램/첨부/페이지에 반복돼도 pageId 추출/tiny 리다이렉트/제목 조회는 처음 한 번만
+- None(매핑 없음)도 그대로 기억 (negative) → 바꿀 수 없는 외부/다른 공간 링크도 재조회하지 않음
+- 조회 중 예외가 난 결과는 기억하지 않음 (일시 오류가 실행 내내 남지 않도록, 호출 쪽에서 put 생략)
+- hit / miss / negative 개수로 적중률 보고 (format_stats)
+- 여러 워커 스레드에서 동시에 써도 되도록 lock 으로 보호
+"""
+
+from typing import Dict, Hashable, Optional, Tuple
+import threading
+
+
+class RewriteMemo:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Optional[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Optional[str]]:
+        """(hit 여부, 값). negative 항목은 (True, None)."""
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Hashable, value: Optional[str]):
+        with self._lock:
+            self._entries[key] = value
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            negatives = sum(1 for v in self._entries.values() if v is None)
+            return {
+                "entries": len(self._entries), "negatives": negatives,
+                "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return (f"url memo: {s['hits']}/{s['hits'] + s['misses']} hits ({s['hit_rate']:.0%}), "
+                f"{s['entries']} urls ({s['negatives']} unmapped)")
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+run_journal.py
+- 긴 마이그레이션 실행의 진행 상황을 append-only JSON Lines 파일로 기록 (한 줄 = 한 레코드)
+    start      : {"t": "start", "base_url", "rules"}                 실행 시작 (설정 확인용)
+    page       : {"t": "page", "id", "status"}                       페이지 처리 결과 (updated / nochange / planned 는 완료,
+                                                                      partial: draw.io 첨부 실패, failed: PUT 실패)
+    attachment : {"t": "attachment", "page", "att", "file"}          draw.io 첨부 새 버전 업로드 완료 (plan 모드면 changeset 기록)
+    short_url  : {"t": "short_url", "old", "new"}                    tiny URL 해석 결과
+    page_id    : {"t": "page_id", "old", "new"}                      pageId 해석 결과
+- sync_every 개 레코드마다 flush + fsync (매 줄 fsync 비용 없이 크래시 시 잃는 범위를 제한), close 시 나머지 sync
+- replay() 는 마지막 줄이 잘린 경우(쓰는 도중 종료)에도 앞부분까지 읽어 반환, resume 으로 열면 잘린 줄은 잘라내고 이어 씀
+- 여러 워커 스레드에서 동시에 써도 되도록 lock 으로 보호
+"""
+
+from typing import Any, Dict, Iterator, Optional
+import json
+import os
+import threading
+
+DEFAULT_PATH = "link-rewriter.journal"
+
+
+class RunJournal:
+    def __init__(self, path: str = DEFAULT_PATH, resume: bool = False, sync_every: int = 50):
+        self.path = path
+        self.sync_every = sync_every
+        self._lock = threading.Lock()
+        self._pending = 0
+        if resume and os.path.exists(path):
+            _truncate_to_last_record(path)  # 잘린 마지막 줄 뒤에 이어 쓰지 않도록
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._pending += 1
+            if self._pending >= self.sync_every:
+                self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
+
+    # ---- 종류별 헬퍼 ----
+    def start(self, base_url: str, rules_hash: str):
+        self.write({"t": "start", "base_url": base_url, "rules": rules_hash})
+
+    def page_done(self, page_id: str, status: str):
+        self.write({"t": "page", "id": str(page_id), "status": status})
+
+    def attachment_uploaded(self, page_id: str, att_id: str, filename: str):
+        self.write({"t": "attachment", "page": str(page_id), "att": att_id, "file": filename})
+
+    def short_url(self, old_url: str, new_url: Optional[str]):
+        self.write({"t": "short_url", "old": old_url, "new": new_url})
+
+    def page_id(self, old_id: str, new_id: Optional[str]):
+        self.write({"t": "page_id", "old": str(old_id), "new": new_id})
+
+
+def _truncate_to_last_record(path: str):
+    valid = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                json.loads(line)
+            except ValueError:
+                break
+            valid += len(line)
+    if valid != os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(valid)
+
+
+def replay(path: str = DEFAULT_PATH) -> Iterator[Dict[str, Any]]:
+    """저널 레코드를 순서대로 yield. 파일이 없으면 아무것도 없음, 깨진 줄(마지막 줄 잘림)에서 멈춤."""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            try:
+                yield json.loads(line)
+            except ValueError:
+                break
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+single_flight.py
+- 같은 key 로 동시에 들어온 조회를 하나의 호출로 합침 (request coalescing)
+- 처음 들어온 호출(leader)만 fn() 을 실행, 진행 중에 들어온 같은 key 호출은 그 결과(또는 예외)를 기다렸다 그대로 받음
+- 완료되면 key 를 비움 → 이후 호출은 각 resolver 의 캐시(메모리/ResolutionCache)에서 응답
+- 허브 페이지/같은 tiny URL 로 가는 링크가 여러 워커에서 동시에 나와도 HTTP 왕복은 한 번
+"""
+
+from typing import Any, Callable, Dict, Hashable, Optional
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.shared = 0  # 다른 호출의 결과를 받아 간 횟수 (절약한 HTTP 왕복 수)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+space_crawler.py
+- 공간 전체 페이지를 /rest/api/content?spaceKey=… 목록으로 열거 (트리 탐색 없이 공간 단위)
+- limit 은 MAX_PAGE_SIZE 로 요청 → 서버가 허용 최대치로 줄여 응답하고, 그 값이 들어간 _links.next 를 끝까지 따라감
+  (start 를 직접 더하지 않으므로 서버가 limit 을 줄여도 빠지는 페이지 없음)
+- expand="body.storage,version,space" 를 주면 목록 요청에서 본문/버전/공간까지 받아 페이지별 본문 GET 불필요
+- 여러 공간을 공간당 스레드 하나로 동시에 열거, 받은 페이지는 bounded queue 로 바로 yield (제너레이터)
+- HTTP 오류(상태 코드)는 해당 공간만 중단하고 출력, 다른 공간은 계속
+"""
+
+from typing import Any, Dict, Iterator, List, Optional
+import queue
+import threading
+
+from confluence_client import ConfluenceClient
+
+MAX_PAGE_SIZE = 1000        # 서버 상한보다 크게 요청 (Confluence 가 허용 최대치로 줄임)
+BODY_EXPAND = "body.storage,version,space"
+
+_DONE = object()
+
+
+def iter_space_pages(client: ConfluenceClient, space_keys: List[str],
+                     expand: Optional[str] = None, workers: int = 4,
+                     page_size: int = MAX_PAGE_SIZE, queue_size: int = 200) -> Iterator[Dict[str, Any]]:
+    """
+    space_keys 의 모든 페이지 JSON 을 받은 순서대로 yield (공간 간 순서는 섞임).
+    동시에 열거하는 공간 수는 workers 로 제한, 소비가 느리면 queue_size 에서 목록 요청이 멈춤.
+    """
+    out: queue.Queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    todo = list(space_keys)
+    lock = threading.Lock()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker():
+        while True:
+            with lock:
+                if not todo:
+                    break
+                space_key = todo.pop(0)
+            try:
+                for page in client.list_content(space_key, "page", expand, page_size):
+                    if not put(page):
+                        return
+            except Exception as e:
+                print(f"❌ Failed to list space {space_key}: {e}")
+        put(_DONE)
+
+    n = max(1, min(workers, len(todo)))
+    threads = [threading.Thread(target=worker, name="space-lister", daemon=True) for _ in range(n)]
+    for t in threads:
+        t.start()
+
+    try:
+        finished = 0
+        while finished < n:
+            item = out.get()
+            if item is _DONE:
+                finished += 1
+                continue
+            yield item
+    finally:
+        stop.set()  # 소비 쪽이 중간에 멈춰도 목록 스레드가 queue 에서 막혀 있지 않도록
+        for t in threads:
+            t.join()
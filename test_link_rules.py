@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""link_rules: tiny 코드('-', '_' 포함) 치환 / 수집"""
+
+from link_rules import get_link_rules
+from tiny_code import encode_tiny, tiny_page_id
+
+BASE = "https://wiki.example.com"
+
+
+def _rules():
+    return get_link_rules(BASE, ["TR"], "ARU")
+
+
+def test_rewrite_tiny_code_with_dash_and_underscore():
+    assert (encode_tiny("1016"), encode_tiny("61699")) == ("_AM", "A-E")
+    body = f'<a href="{BASE}/x/_AM">a</a> <a href="{BASE}/x/A-E">b</a>'
+    mapping = {f"{BASE}/x/_AM": f"{BASE}/x/NEW1", f"{BASE}/x/A-E": f"{BASE}/x/NEW2"}
+    new = _rules().rewrite(body, resolve_tiny=mapping.get)
+    assert new == f'<a href="{BASE}/x/NEW1">a</a> <a href="{BASE}/x/NEW2">b</a>'
+
+
+def test_references_keep_whole_code():
+    page_ids, tiny_urls = _rules().references(f'<a href="{BASE}/x/A-E">b</a>')
+    assert tiny_urls == {f"{BASE}/x/A-E"}
+    assert tiny_page_id(next(iter(tiny_urls))) == "61699"
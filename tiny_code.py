@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+tiny_code.py
+- Confluence tiny 링크(/x/CODE) 의 코드 ↔ page id 를 로컬에서 변환 (리다이렉트 / shortlink API 호출 없음)
+    CODE = page id 를 little-endian 8바이트로 → base64 (11자 + '=') → 끝의 'A'/'=' 제거 → '/'→'-', '+'→'_'
+    (예: 1822851096 → 'GICmb'. 0 바이트를 먼저 잘라내면 마지막 문자가 달라짐 → 반드시 8바이트 전체를 인코딩 후 'A' 제거)
+  디코딩은 반대로: 문자 복원 → 'A' 로 11자까지 채우고 '=' → base64 해제(8바이트) → little-endian unpack
+- 규칙은 서버 구현에 의존 → codec_matches() 로 서버가 준 _links.tinyui 와 대조해 맞을 때만 사용하고,
+  아니면 호출 쪽은 기존 리다이렉트 조회로 fallback
+- 디코딩한 id 의 페이지가 없을 수 있음 (오타/삭제된 페이지) → 호출 쪽에서 id 조회 결과로 확인
+"""
+
+from typing import Any, Dict, Iterable, Optional
+import base64
+import binascii
+import re
+import struct
+
+SAMPLE_SIZE = 25  # codec_matches 에서 대조할 페이지 수
+
+_TINY_PATH = re.compile(r"/x/([A-Za-z0-9_-]+)")
+_CODE_LENGTH = 11  # 8바이트의 base64 길이 ('=' 제외)
+
+
+def encode_tiny(page_id: str) -> str:
+    """page id → tiny 코드 (예: 1234567 → 'h9YS', 1822851096 → 'GICmb')"""
+    code = base64.b64encode(struct.pack("<Q", int(page_id))).decode("ascii").rstrip("A=")
+    return (code or "A").replace("/", "-").replace("+", "_")
+
+
+def decode_tiny(code: str) -> Optional[str]:
+    """tiny 코드 → page id 문자열. 코드 형식이 아니면 None."""
+    if not code or len(code) > _CODE_LENGTH:
+        return None
+    s = code.replace("-", "/").replace("_", "+").ljust(_CODE_LENGTH, "A") + "="
+    try:
+        b = base64.b64decode(s, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    page_id = struct.unpack("<Q", b)[0]
+    return str(page_id) if page_id else None
+
+
+def tiny_path(page_id: str) -> str:
+    """page id → '/x/CODE' (_links.tinyui 와 같은 형식)"""
+    return f"/x/{encode_tiny(page_id)}"
+
+
+def tiny_page_id(url: str) -> Optional[str]:
+    """tiny URL(…/x/CODE, 뒤에 ?query/#fragment 가능) → page id. tiny URL 이 아니면 None."""
+    m = _TINY_PATH.search(url.split("?", 1)[0].split("#", 1)[0])
+    return decode_tiny(m.group(1)) if m else None
+
+
+def codec_matches(pages: Iterable[Dict[str, Any]], sample_size: int = SAMPLE_SIZE) -> bool:
+    """
+    page info({"id", "tinyui"}, 제목 인덱스 항목 등) 중 tinyui 가 있는 것 sample_size 개를 encode/decode 결과와 대조.
+    대조할 샘플이 없거나 하나라도 다르면 False.
+    """
+    checked = 0
+    for page in pages:
+        if checked >= sample_size:
+            break
+        tinyui = (page or {}).get("tinyui")
+        if not tinyui:
+            continue
+        checked += 1
+        if tinyui.rstrip("/").split("/")[-1] != encode_tiny(page["id"]) or tiny_page_id(tinyui) != str(page["id"]):
+            print(f"⚠️ Tiny code mismatch for page {page['id']}: {tinyui} (expected {tiny_path(page['id'])})")
+            return False
+    return checked > 0
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+title_index.py
+- TARGET 공간 전체를 시작 시 한 번 페이지 단위로 훑어 title → (id, title, webui, tinyui) 인덱스 구성
+- 제목 조회는 메모리에서 응답 → 링크 수가 아니라 공간 크기에 비례하는 API 호출
+- 인덱스에 없는 제목(인덱스 구축 이후 생성된 페이지)만 라이브 조회로 fallback, 결과(없음 포함)는 인덱스에 추가
+"""
+
+from typing import Optional, Callable, Dict, Any
+
+from confluence_client import ConfluenceClient
+
+TitleIndex = Dict[str, Optional[Dict[str, Any]]]
+
+
+def page_info_from_content(content: Dict[str, Any]) -> Dict[str, Any]:
+    """/rest/api/content 결과 항목 → 인덱스 항목 (get_page_info_by_title 반환 형식과 동일)"""
+    links = content.get("_links", {}) or {}
+    return {
+        "id": content["id"],
+        "title": content["title"],
+        "webui": links.get("webui"),
+        "tinyui": links.get("tinyui"),
+    }
+
+
+def build_title_index(client: ConfluenceClient, space_key: str, page_size: int = 200) -> TitleIndex:
+    """
+    GET /rest/api/content?spaceKey=...&type=page 를 끝까지 페이지네이션하며 인덱스 생성.
+    서버가 limit 을 더 작게 잘라도 _links.next / 실제 반환 건수 기준으로 진행.
+    """
+    index: TitleIndex = {}
+    for page in client.list_content(space_key, "page", page_size=page_size):
+        index[page["title"]] = page_info_from_content(page)
+    return index
+
+
+def lookup_title(index: TitleIndex, title: str,
+                 fallback: Callable[[str], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """
+    인덱스에서 제목 조회. 없으면 fallback(title) 으로 한 번만 라이브 조회하고 결과를 기억.
+    (없는 제목도 None 으로 기록해 같은 제목을 반복 조회하지 않음)
+    """
+    if title in index:
+        return index[title]
+    info = fallback(title)
+    index[title] = info
+    return info